@@ -0,0 +1,294 @@
+"""
+Benchmarks for Relations RESTful resources against a mock source
+
+From the repo root, with lib on the path:
+
+    python benchmark/resource_benchmark.py --save benchmark/baseline.json
+    python benchmark/resource_benchmark.py --compare benchmark/baseline.json --save benchmark/results.json
+
+To see what the fastest serializer gains over the standard library:
+
+    python benchmark/resource_benchmark.py --only encode get_list --serializer json --save json.json
+    python benchmark/resource_benchmark.py --only encode get_list --serializer orjson --compare json.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+
+import flask
+import flask_restful
+
+import relations
+import relations.unittest
+
+import relations_restful
+
+SOURCE = "RelationsRestfulBenchmark"
+
+WIDTHS = [2, 10, 30]   # Extra string fields on the model
+PARENTS = [0, 2, 8]    # Parents the model has, each with its own field
+ROWS = 100             # Rows to start with
+BATCH = 20             # Items in each bulk call
+ITERATIONS = 50        # Timed calls per benchmark
+WARMUP = 10            # Untimed calls before those
+
+SERIALIZERS = {
+    "json": relations_restful.JSONSerializer,
+    "orjson": relations_restful.OrjsonSerializer
+}
+
+class BenchmarkModel(relations.Model):
+    SOURCE = SOURCE
+
+class Parent(BenchmarkModel):
+    id = int
+    name = str
+
+def build(width, parents, serializer="orjson"):
+    """
+    Creates a model with width extra fields and parents parents, with rows, and a client for its resource
+    responding with serializer
+    """
+
+    relations.unittest.MockSource(SOURCE)
+
+    name = f"Wide{width}Parents{parents}"
+
+    attributes = {"id": int, "name": str}
+
+    for index in range(parents):
+        attributes[f"parent_{index}_id"] = int
+
+    for index in range(width):
+        attributes[f"field_{index}"] = str, ""
+
+    model = type(name, (BenchmarkModel, ), attributes)
+
+    for index in range(parents):
+        relations.OneToMany(
+            Parent, model,
+            parent_child=f"{model.thy().NAME}_{index}",
+            child_parent=f"parent_{index}",
+            child_field=f"parent_{index}_id"
+        )
+
+    Parent([{"name": f"parent {index}"} for index in range(ROWS)]).create()
+
+    model([row(model, parents, index) for index in range(ROWS)]).create()
+
+    resource = type(f"{name}Resource", (relations_restful.Resource, ), {"MODEL": model})
+
+    app = flask.Flask(f"benchmark-{name}")
+    restful = flask_restful.Api(app)
+    restful.add_resource(resource, *resource.thy().endpoints())
+
+    app.config["SERIALIZER"] = SERIALIZERS[serializer]()
+    app.config["SERIALIZER"].register(restful)
+
+    return resource.thy(), app.test_client()
+
+def row(model, parents, index):
+    """
+    Values for a new row
+    """
+
+    values = {"name": f"{model.__name__} {index}"}
+
+    for parent in range(parents):
+        values[f"parent_{parent}_id"] = index % ROWS + 1
+
+    return values
+
+def get_id(thy, api, iteration):
+    """
+    Retrieves a single record
+    """
+
+    return api.get(f"/{thy.SINGULAR}/{iteration % ROWS + 1}")
+
+def get_list(thy, api, iteration): # pylint: disable=unused-argument
+    """
+    Retrieves a page with formats
+    """
+
+    return api.get(f"/{thy.SINGULAR}?limit={BATCH}")
+
+def options(thy, api, iteration): # pylint: disable=unused-argument
+    """
+    Generates a form with parent options
+    """
+
+    return api.options(f"/{thy.SINGULAR}", json={thy.SINGULAR: row(thy.MODEL, len(thy._parents), iteration)})
+
+def post(thy, api, iteration):
+    """
+    Creates a batch in bulk
+    """
+
+    return api.post(f"/{thy.SINGULAR}", json={
+        thy.PLURAL: [row(thy.MODEL, len(thy._parents), iteration * BATCH + index) for index in range(BATCH)],
+        "bulk": True
+    })
+
+def patch(thy, api, iteration):
+    """
+    Updates a batch each with its own changes
+    """
+
+    return api.patch(f"/{thy.SINGULAR}", json={
+        thy.PLURAL: [
+            {"id": (iteration * BATCH + index) % ROWS + 1, "changes": {"name": f"changed {index % 4}"}}
+            for index in range(BATCH)
+        ]
+    })
+
+def delete(thy, api, iteration):
+    """
+    Deletes a batch, created beforehand
+    """
+
+    start = ROWS + iteration * BATCH + 1
+
+    return api.delete(f"/{thy.SINGULAR}", json={"filter": {"id__in": list(range(start, start + BATCH))}})
+
+EXPORTS = {} # Every row exported, by model, for encode
+
+def encode(thy, api, iteration): # pylint: disable=unused-argument
+    """
+    Encodes every row as a response, without querying, to isolate the serializer
+    """
+
+    if thy.SINGULAR not in EXPORTS:
+        EXPORTS[thy.SINGULAR] = {thy.PLURAL: [model.export() for model in thy.MODEL.many()]}
+
+    with api.application.test_request_context():
+        return api.application.config["SERIALIZER"].output(EXPORTS[thy.SINGULAR], 200)
+
+BENCHMARKS = [get_id, get_list, options, post, patch, delete, encode]
+
+def measure(benchmark, thy, api, iterations=ITERATIONS):
+    """
+    Times each call to a benchmark, making sure each one worked
+    """
+
+    if benchmark is delete:
+        thy.MODEL([row(thy.MODEL, len(thy._parents), index) for index in range((WARMUP + iterations) * BATCH)]).create()
+
+    for iteration in range(WARMUP):
+        benchmark(thy, api, iteration)
+
+    durations = []
+
+    for iteration in range(WARMUP, WARMUP + iterations):
+
+        start = time.perf_counter()
+        response = benchmark(thy, api, iteration)
+        durations.append((time.perf_counter() - start) * 1000)
+
+        if response.status_code >= 400:
+            raise Exception(f"{benchmark.__name__} failed with {response.status_code}: {response.json}")
+
+    durations.sort()
+
+    return {
+        "mean": statistics.mean(durations),
+        "p50": durations[len(durations) // 2],
+        "p95": durations[int(len(durations) * 0.95)],
+        "ops": 1000 * len(durations) / sum(durations)
+    }
+
+def run(benchmarks=None, iterations=ITERATIONS, serializer="orjson"):
+    """
+    Runs every benchmark, or just those named, across every width and parents
+    """
+
+    results = {}
+
+    for benchmark in BENCHMARKS:
+
+        if benchmarks and benchmark.__name__ not in benchmarks:
+            continue
+
+        for width in WIDTHS:
+            for parents in PARENTS:
+                thy, api = build(width, parents, serializer)
+                results[f"{benchmark.__name__}/width={width}/parents={parents}"] = measure(benchmark, thy, api, iterations)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows": ROWS,
+            "batch": BATCH,
+            "iterations": iterations,
+            "serializer": serializer
+        },
+        "results": results
+    }
+
+def compare(baseline, current, tolerance):
+    """
+    Prints how the median of each compares to the baseline, returning which got slower than tolerance
+    """
+
+    slower = []
+
+    print(f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>8}")
+
+    for name, result in current["results"].items():
+
+        if name not in baseline["results"]:
+            print(f"{name:<40} {'-':>10} {result['p50']:>10.3f} {'-':>8}")
+            continue
+
+        ratio = result["p50"] / baseline["results"][name]["p50"]
+        print(f"{name:<40} {baseline['results'][name]['p50']:>10.3f} {result['p50']:>10.3f} {ratio:>8.2f}")
+
+        if ratio > 1 + tolerance:
+            slower.append(name)
+
+    return slower
+
+def main(argv=None):
+    """
+    Runs, then saves and compares as asked
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmarks Relations RESTful resources")
+    parser.add_argument("--save", help="file to save results to as json")
+    parser.add_argument("--compare", help="baseline json to compare results to")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="how much slower than the baseline fails")
+    parser.add_argument("--only", nargs="*", help="benchmarks to run, all if none")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="timed calls per benchmark")
+    parser.add_argument("--serializer", choices=sorted(SERIALIZERS), default="orjson", help="how responses are encoded")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("relations_restful").setLevel(logging.ERROR)
+
+    current = run(args.only, args.iterations, args.serializer)
+
+    if args.save:
+        with open(args.save, "w") as save_file:
+            json.dump(current, save_file, indent=4, sort_keys=True)
+
+    if args.compare and not os.path.exists(args.compare):
+        print(f"no baseline at {args.compare}, save one with --save {args.compare}")
+    elif args.compare:
+        with open(args.compare, "r") as baseline_file:
+            slower = compare(json.load(baseline_file), current, args.tolerance)
+        if slower:
+            print(f"slower than baseline: {', '.join(slower)}")
+            return 1
+    else:
+        json.dump(current, sys.stdout, indent=4, sort_keys=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
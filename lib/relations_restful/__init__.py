@@ -6,7 +6,12 @@ import inspect
 
 import flask_restful
 
-from relations_restful.resource import ResourceError, ResourceIdentity, Resource, exceptions
+from relations_restful.cache import Cache, MemoryCache
+from relations_restful.compression import Compression
+from relations_restful.timing import Histogram, Timer
+from relations_restful.queries import Queries
+from relations_restful.serializer import Serializer, JSONSerializer, OrjsonSerializer, MsgpackSerializer
+from relations_restful.resource import ResourceError, ResourceSpec, ResourceIdentity, Resource, AsyncResource, exceptions, synchronous
 
 def resources(module):
     """
@@ -22,23 +27,31 @@ def resources(module):
         )
     ]
 
-def ensure(module, models):
+def ensure(module, models, base=Resource):
     """
-    Creates the Resources for all models
+    Creates the Resources for all models, from base
     """
 
     exists = [resource.MODEL for resource in resources(module)]
 
     return [
-        type(model.__name__, (Resource, ), {'MODEL': model})
+        type(model.__name__, (base, ), {'MODEL': model})
         for model in models if model not in exists
     ]
 
-def attach(restful, module, models):
+def attach(restful, module, models, base=Resource, serializer=None):
     """
-    Attach all Reources to a Restful
+    Attach all Reources to a Restful, creating any missing from base, responding with serializer or the fastest,
+    and with msgpack too if it's installed
     """
 
+    (serializer or Serializer.fastest()).register(restful)
+
+    try:
+        MsgpackSerializer().register(restful)
+    except ImportError: # pragma: no cover
+        pass
+
     class Model(flask_restful.Resource):
         """
         Custom class for each call
@@ -54,9 +67,22 @@ def attach(restful, module, models):
 
     restful.add_resource(Model, "/model")
 
-    for resource in resources(module) + ensure(module, models):
+    class Timing(flask_restful.Resource):
+        """
+        Latencies for each call
+        """
+
+        def get(self):
+            """
+            List latencies by resource and method
+            """
+            return {"timings": Timer.stats()}
+
+    restful.add_resource(Timing, "/timing")
+
+    for resource in resources(module) + ensure(module, models, base):
 
-        thy = resource.thy()
+        thy = resource.identity()
 
         Model.MODELS.append({
             "id": thy._model._id,
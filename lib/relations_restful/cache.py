@@ -0,0 +1,176 @@
+"""
+Cache module for Relations RESTful
+"""
+
+import json
+import time
+import weakref
+import threading
+import collections
+
+class Cache:
+    """
+    Base cache, values stored by namespace and key, for plugging in other backends
+    """
+
+    CACHES = weakref.WeakSet() # All caches, so writes anywhere can invalidate them
+
+    hits = None   # How many keys were found
+    misses = None # How many keys weren't
+
+    def __init__(self):
+
+        self.hits = 0
+        self.misses = 0
+
+        Cache.CACHES.add(self)
+
+    def many(self, namespace, keys):
+        """
+        Gets all the values found for keys as a dict
+        """
+
+        raise NotImplementedError(f"need to implement 'many' in {self.__class__.__name__}")
+
+    def update(self, namespace, values):
+        """
+        Sets all the values by key from a dict
+        """
+
+        raise NotImplementedError(f"need to implement 'update' in {self.__class__.__name__}")
+
+    def delete(self, namespace, keys=None):
+        """
+        Removes keys, or the whole namespace if keys is None
+        """
+
+        raise NotImplementedError(f"need to implement 'delete' in {self.__class__.__name__}")
+
+    def stats(self):
+        """
+        Hit and miss counters
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    @classmethod
+    def invalidate(cls, namespace, keys=None):
+        """
+        Removes keys, or the whole namespace, from every cache
+        """
+
+        for cache in list(cls.CACHES):
+            cache.delete(namespace, keys)
+
+class MemoryCache(Cache):
+    """
+    In process cache, with TTL and LRU eviction, safe across threads
+    """
+
+    ttl = None   # Seconds values live for, None for forever
+    size = None  # Most values kept before evicting the least recently used
+    bytes = None # Most bytes kept before evicting the least recently used, None for no limit
+
+    def __init__(self, ttl=60, size=10000, bytes=None): # pylint: disable=redefined-builtin
+
+        super().__init__()
+
+        self.ttl = ttl
+        self.size = size
+        self.bytes = bytes
+
+        self._values = collections.OrderedDict()
+        self._namespaces = collections.defaultdict(set)
+        self._weight = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+
+        return len(self._values)
+
+    @staticmethod
+    def weigh(value):
+        """
+        Rough size of a value in bytes
+        """
+
+        if isinstance(value, (str, bytes)):
+            return len(value)
+
+        return len(json.dumps(value, default=str))
+
+    def _remove(self, namespace, key):
+        """
+        Removes a single value, if it's there
+        """
+
+        _, _, weight = self._values.pop((namespace, key), (None, None, 0))
+
+        self._weight -= weight
+        self._namespaces[namespace].discard(key)
+
+        if not self._namespaces[namespace]:
+            del self._namespaces[namespace]
+
+    def many(self, namespace, keys):
+
+        found = {}
+        now = time.monotonic()
+
+        with self._lock:
+
+            for key in keys:
+
+                expires, value, _ = self._values.get((namespace, key), (None, None, 0))
+
+                if expires is not None and (self.ttl is None or expires > now):
+                    self._values.move_to_end((namespace, key))
+                    found[key] = value
+                    self.hits += 1
+                    continue
+
+                if expires is not None:
+                    self._remove(namespace, key)
+
+                self.misses += 1
+
+        return found
+
+    def update(self, namespace, values):
+
+        expires = time.monotonic() + (self.ttl or 0)
+
+        with self._lock:
+
+            for key, value in values.items():
+
+                weight = self.weigh(value) if self.bytes is not None else 0
+
+                self._remove(namespace, key)
+                self._values[(namespace, key)] = (expires, value, weight)
+                self._namespaces[namespace].add(key)
+                self._weight += weight
+
+            while self._values and (len(self._values) > self.size or (self.bytes is not None and self._weight > self.bytes)):
+                self._remove(*next(iter(self._values)))
+
+    def delete(self, namespace, keys=None):
+
+        with self._lock:
+
+            if keys is None:
+                keys = list(self._namespaces.get(namespace, []))
+
+            for key in keys:
+                self._remove(namespace, key)
+
+    def stats(self):
+
+        stats = super().stats()
+        stats["size"] = len(self)
+        stats["bytes"] = self._weight
+
+        return stats
@@ -0,0 +1,107 @@
+"""
+Compression module for Relations RESTful
+"""
+
+import zlib
+
+import flask
+
+class Compression:
+    """
+    Compresses responses as the client accepts, buffered or streamed
+    """
+
+    WBITS = {
+        "gzip": 16 + zlib.MAX_WBITS,
+        "deflate": zlib.MAX_WBITS
+    } # Encodings in order of preference, with their zlib window bits
+
+    minimum = None # Fewest bytes worth compressing a buffered response, streams always are
+    level = None   # zlib level, 1 fastest to 9 smallest
+
+    def __init__(self, minimum=1024, level=6):
+
+        self.minimum = minimum
+        self.level = level
+
+    def encoding(self):
+        """
+        Best encoding the current request accepts, None if none
+        """
+
+        return flask.request.accept_encodings.best_match(list(self.WBITS))
+
+    def compressor(self, encoding):
+        """
+        New zlib compressor for an encoding
+        """
+
+        return zlib.compressobj(self.level, zlib.DEFLATED, self.WBITS[encoding])
+
+    def stream(self, chunks, encoding):
+        """
+        Compresses chunks as they come, closing them when done
+        """
+
+        compressor = self.compressor(encoding)
+
+        try:
+
+            for chunk in chunks:
+
+                compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+
+                if compressed:
+                    yield compressed
+
+            yield compressor.flush()
+
+        finally:
+
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def compress(self, response):
+        """
+        Compresses a response if the client accepts it and it's worth it
+        """
+
+        if (
+            response.status_code < 200 or response.status_code in [204, 304]
+            or response.direct_passthrough or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        encoding = self.encoding()
+
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+
+            response.response = self.stream(response.response, encoding)
+            response.headers.remove("Content-Length")
+
+        else:
+
+            data = response.get_data()
+
+            if len(data) < self.minimum:
+                return response
+
+            compressor = self.compressor(encoding)
+            response.set_data(compressor.compress(data) + compressor.flush())
+
+        response.headers["Content-Encoding"] = encoding
+
+        # Compressed bytes are another representation, so a strong ETag gets the encoding,
+        # which Resource.match() and unmodified() strip back off
+
+        etag, weak = response.get_etag()
+
+        if etag is not None and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+
+        return response
@@ -0,0 +1,99 @@
+"""
+Queries module for Relations RESTful
+"""
+
+import functools
+import threading
+import contextvars
+
+import relations
+
+class Queries:
+    """
+    Counts calls into sources by method, for everything running in a context, safe across threads
+    """
+
+    METHODS = ["create", "retrieve", "count", "titles", "update", "delete"] # Source methods that query
+
+    CURRENT = contextvars.ContextVar("relations_restful_queries", default=None) # Counting the current context
+    INSIDE = contextvars.ContextVar("relations_restful_inside", default=False)  # Already in a source call
+
+    counts = None # Calls by method
+
+    def __init__(self):
+
+        self.counts = {}
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+
+        return sum(self.counts.values())
+
+    def add(self, method):
+        """
+        Counts a call
+        """
+
+        with self._lock:
+            self.counts[method] = self.counts.get(method, 0) + 1
+
+    @classmethod
+    def counted(cls, method, call):
+        """
+        Wraps a source method to count calls in whatever's counting the context,
+        but not calls a source makes to itself, like titles retrieving first
+        """
+
+        @functools.wraps(call)
+        def wrap(*args, **kwargs):
+
+            queries = cls.CURRENT.get()
+
+            if queries is not None and not cls.INSIDE.get():
+                queries.add(method)
+
+            token = cls.INSIDE.set(True)
+
+            try:
+                return call(*args, **kwargs)
+            finally:
+                cls.INSIDE.reset(token)
+
+        wrap.relations_restful_counted = True
+
+        return wrap
+
+    @classmethod
+    def watch(cls, source):
+        """
+        Wraps all a source's query methods, if not already
+        """
+
+        for method in cls.METHODS:
+
+            call = getattr(source, method, None)
+
+            if call is not None and not getattr(call, "relations_restful_counted", False):
+                setattr(source, method, cls.counted(method, call))
+
+    @classmethod
+    def start(cls):
+        """
+        Starts counting the current context, watching every source, returning the count and token to stop
+        """
+
+        for source in list(relations.SOURCES.values()):
+            cls.watch(source)
+
+        queries = cls()
+
+        return queries, cls.CURRENT.set(queries)
+
+    @classmethod
+    def stop(cls, token):
+        """
+        Stops counting the current context
+        """
+
+        cls.CURRENT.reset(token)
@@ -2,19 +2,84 @@
 Resource module for Relations and Flask RESTful
 """
 
-# pylint: disable=not-callable
+# pylint: disable=not-callable,too-many-lines
 
 
 import flask
 import flask_restful
 
+import io
+import csv
+import json
+import time
+import queue
+import base64
+import asyncio
+import hashlib
+import logging
 import functools
+import threading
 import traceback
+import contextlib
+import contextvars
+import concurrent.futures
+import werkzeug.http
 import werkzeug.exceptions
 
 import opengui
 import relations
 
+from relations_restful.cache import Cache
+from relations_restful.timing import Timer
+from relations_restful.queries import Queries
+from relations_restful.compression import Compression
+from relations_restful.serializer import MsgpackSerializer
+
+logger = logging.getLogger(__name__)
+
+ERRORS = queue.Queue(1000) # Unexpected errors waiting to be logged, dropped if it's full
+
+_logging = None # Thread logging them
+_lock = threading.Lock()
+
+def drain():
+    """
+    Logs unexpected errors with their tracebacks as they're queued
+    """
+
+    while True:
+
+        method, path, exception = ERRORS.get()
+
+        try:
+            logger.error("%s %s failed", method, path, exc_info=(type(exception), exception, exception.__traceback__))
+        finally:
+            ERRORS.task_done()
+
+def log(exception):
+    """
+    Queues an unexpected error to be logged off the request, so formatting the traceback doesn't hold it up
+    """
+
+    global _logging # pylint: disable=global-statement
+
+    with _lock:
+        if _logging is None:
+            _logging = threading.Thread(target=drain, daemon=True)
+            _logging.start()
+
+    try:
+        ERRORS.put_nowait((flask.request.method, flask.request.path, exception))
+    except queue.Full:
+        pass
+
+def code(name):
+    """
+    Error code from a name, like not_found from Not Found
+    """
+
+    return name.lower().replace(" ", "_").replace("'", "")
+
 def exceptions(endpoint):
     """
     Decorator that adds and handles a database session
@@ -27,28 +92,43 @@ def exceptions(endpoint):
 
             response = endpoint(*args, **kwargs)
 
-        except werkzeug.exceptions.BadRequest as exception:
+        except werkzeug.exceptions.HTTPException as exception:
 
             response = {
-                "message": exception.description
-            }, 400
+                "message": exception.description,
+                "code": code(exception.name)
+            }, exception.code
 
         except relations.ModelError as exception:
 
+            # Relations only says what went wrong in the message
+
             message = str(exception)
 
             status_code = 404 if "none retrieved" in message else 500
 
             response = {
                 "message": message,
+                "code": "not_found" if status_code == 404 else "model_error"
             }, status_code
 
-        except Exception as exception:
+        except Exception as exception: # pylint: disable=broad-except
 
             response = {
                 "message": str(exception),
-                "traceback": traceback.format_exc()
-            }, 500
+                "code": "internal_error"
+            }
+
+            # Tracebacks are for debugging, else logged if set to, else in the background
+
+            tracebacks = flask.current_app.config.get("RELATIONS_RESTFUL_TRACEBACKS")
+
+            if tracebacks or (tracebacks is None and flask.current_app.debug):
+                response["traceback"] = traceback.format_exc()
+            else:
+                log(exception)
+
+            response = response, 500
 
         return response
 
@@ -71,7 +151,174 @@ class ResourceError(Exception):
         """
         return f"{self.resource.__class__.__name__}: {self.message}"
 
-class ResourceIdentity:
+class ResourceSpec: # pylint: disable=too-many-instance-attributes
+    """
+    Everything the current request asks for, parsed once and shared by the helpers
+    """
+
+    RESERVED = [
+        "sort", "count", "total", "stream", "cursor", "fields", "formats", "bulk", "layout", "export", "titles"
+    ] # Arguments that aren't criteria, besides limit, unless they're fields
+
+    args = None   # Query arguments
+    body = None   # Request JSON
+    filter = None # Criteria from arguments and filter
+    sort = None   # Sort from arguments then body
+    limit = None  # Limit from arguments and body
+    count = None  # Whether to count
+    total = None  # Whether to count as well
+    stream = None # Stream setting, if sent
+    cursor = None # Encoded cursor, if sent
+    fields = None # Fields to return, if sent
+    formats = None # Whether to include formats
+    titles = None # Parent titles looked up so far, by parent name
+    bulk = None   # Whether to create in batches
+    layout = None # How to lay out lists, if not as records
+    export = None # Export format, if sent
+    titled = None # Whether to export parent titles, sent as titles
+    names = None  # Fields of the resource's model, which as arguments are always criteria
+
+    def __init__(self):
+
+        if flask.request.mimetype == MsgpackSerializer.MIMETYPE:
+            try:
+                self.body = MsgpackSerializer().loads(flask.request.get_data())
+            except ImportError as exception:
+                raise werkzeug.exceptions.UnsupportedMediaType("msgpack isn't installed") from exception
+        else:
+            try:
+                self.body = flask.request.json
+            except: # pylint: disable=bare-except
+                self.body = None
+
+        if self.body is None:
+            self.body = {}
+
+        self.args = flask.request.args.to_dict() if flask.request.args else {}
+
+        # A reserved name that's also a field, like a total column, is a filter as an argument
+        # and a setting only in the body
+
+        self.names = self.model_fields()
+
+        self.filter = {
+            name: value
+            for name, value in self.args.items()
+            if not self.reserved(name)
+        }
+
+        if "filter" in self.body:
+            self.filter.update(self.body["filter"])
+
+        self.sort = self.args["sort"].split(',') if self.reserved("sort") and "sort" in self.args else []
+
+        if "sort" in self.body:
+            self.sort.extend(self.body["sort"])
+
+        try:
+
+            self.limit = {
+                name.split('__')[-1]: int(value)
+                for name, value in self.args.items()
+                if name.startswith("limit") and self.reserved(name)
+            }
+
+            if "limit" in self.body:
+                self.limit.update({name: int(value) for name, value in self.body["limit"].items()})
+
+        except (AttributeError, TypeError, ValueError) as exception:
+            raise werkzeug.exceptions.BadRequest("limit values must be integers") from exception
+
+        self.count = self.flag(self.value("count", False))
+        self.total = self.flag(self.value("total", False))
+        self.stream = self.value("stream")
+        self.cursor = self.value("cursor")
+        self.fields = self.value("fields")
+
+        if isinstance(self.fields, str):
+            self.fields = self.fields.split(',')
+
+        self.formats = self.flag(self.value("formats", True))
+        self.titles = {}
+        self.bulk = self.flag(self.value("bulk", False)) or flask.request.mimetype == "application/x-ndjson"
+        self.layout = self.value("layout")
+        self.export = self.value("export")
+        self.titled = self.flag(self.value("titles", False))
+
+        logger.debug("%s %s spec %s", flask.request.method, flask.request.path, self.__dict__)
+
+    @staticmethod
+    def model_fields():
+        """
+        Names of the fields of the model of the resource handling the request, none if it isn't one
+        """
+
+        view = flask.current_app.view_functions.get(flask.request.endpoint)
+        resource = getattr(view, "view_class", None)
+
+        if not isinstance(resource, type) or not issubclass(resource, ResourceIdentity) or resource.MODEL is None:
+            return []
+
+        return list(resource.identity()._model._fields._names)
+
+    def reserved(self, name):
+        """
+        Whether an argument is a setting rather than criteria, so not if it's a field
+        """
+
+        return (name.startswith("limit") or name in self.RESERVED) and name not in self.names
+
+    def value(self, name, default=None):
+        """
+        Gets a setting from the body, else the arguments, unless it's a field there
+        """
+
+        if name in self.body:
+            return self.body[name]
+
+        if name in self.names:
+            return default
+
+        return self.args.get(name, default)
+
+    @staticmethod
+    def flag(value):
+        """
+        Converts a setting to a boolean, allowing for strings
+        """
+
+        if isinstance(value, (bool, int)):
+            return value
+
+        return value.lower() not in ["0", "no", "false"]
+
+    def key(self, *prefix):
+        """
+        Normalized form of what's asked for, for caching
+        """
+
+        return json.dumps(
+            [*prefix, self.filter, self.sort, self.limit, self.count, self.total, self.cursor, self.fields, self.formats, self.layout],
+            sort_keys=True,
+            default=str
+        )
+
+    @classmethod
+    def current(cls):
+        """
+        The spec for the current request, only parsed the first time, kept with the request
+        as flask.g is shared by every request in an app context
+        """
+
+        environ = flask.request.environ
+
+        if "relations_restful.spec" not in environ:
+            with Timer.phased("spec"):
+                environ["relations_restful.spec"] = cls()
+
+        return environ["relations_restful.spec"]
+
+class ResourceIdentity: # pylint: disable=too-many-instance-attributes
     """
     Intermediate static type class for constructing mode information with a full resource
     """
@@ -81,12 +328,40 @@ class ResourceIdentity:
     PLURAL = None
     FIELDS = None
     LIST = None
+    CACHE = None
+    RESPONSES = None
+    STREAM = False
+    VERSION = None
+    EXECUTOR = None
+    TIMEOUT = None
+    BULK = None
+    UNIQUE = None
+    TIMING = True
+    BUDGET = None
+    COMPRESSION = None
 
     _model = None
     _fields = None
+    _defaults = None
+    _parents = None
+    _formats = None
+    _identity = None
+
+    @staticmethod
+    def _default(model_field):
+        """
+        Evaluates a model field's default for a form
+        """
+
+        default = model_field.default() if callable(model_field.default) else model_field.default
+
+        if isinstance(default, set):
+            default = sorted(list(default))
+
+        return default
 
     @classmethod
-    def thy(cls, self=None): # pylint: disable=too-many-branches
+    def thy(cls, self=None): # pylint: disable=too-many-branches,too-many-statements
         """
         Base identity to be known without instantiating the class
         """
@@ -115,9 +390,10 @@ class ResourceIdentity:
             self.FIELDS = []
 
         self._fields = []
+        self._defaults = {}
         fields = opengui.Fields(fields=self.FIELDS)
 
-        for model_field in self._model._fields._order:
+        for index, model_field in enumerate(self._model._fields._order):
 
             form_field = {
                 "name": model_field.name,
@@ -132,17 +408,39 @@ class ResourceIdentity:
                 form_field["readonly"] = True
 
             if model_field.default is not None:
-                form_field["default"] = model_field.default() if callable(model_field.default) else model_field.default
-                if isinstance(form_field["default"], set):
-                    form_field["default"] = sorted(list(form_field["default"]))
+                form_field["default"] = self._default(model_field)
+                if callable(model_field.default):
+                    self._defaults[index] = model_field
             elif not model_field.auto and (not model_field.none or model_field.name in self._model._titles):
                 form_field["required"] = True
 
             if model_field.name in fields.names:
-                form_field.update(fields[model_field.name].to_dict())
+                override = fields[model_field.name].to_dict()
+                if "default" in override:
+                    self._defaults.pop(index, None)
+                form_field.update(override)
 
             self._fields.append(form_field)
 
+        # Formats that don't depend on data, so they needn't be built each request
+
+        self._formats = {}
+
+        for model_field, form_field in zip(self._model._fields._order, self._fields):
+            if self._model._ancestor(model_field.name) is None and (model_field.format is not None or "titles" in form_field):
+                self._formats[model_field.name] = {}
+                if model_field.format is not None:
+                    self._formats[model_field.name]["format"] = model_field.format
+                if "titles" in form_field:
+                    self._formats[model_field.name]["titles"] = form_field["titles"]
+
+        # Names of parents by child field, for caching their titles
+
+        self._parents = {
+            relation.child_field: relation.Parent.thy().NAME
+            for relation in self._model.PARENTS.values()
+        }
+
         if self.LIST is None:
             self.LIST = list(self._model._list)
 
@@ -152,8 +450,44 @@ class ResourceIdentity:
             if field.split("__")[0] not in self._model._fields:
                 raise ResourceError(self, f"cannot find field {field} from list")
 
+        # What to match on to upsert, the id unless said otherwise
+
+        if self.UNIQUE is None:
+            self.UNIQUE = [self._model._id] if self._model._id is not None else []
+
+        if isinstance(self.UNIQUE, str):
+            self.UNIQUE = [self.UNIQUE]
+
+        for field in self.UNIQUE:
+            if field not in self._model._fields:
+                raise ResourceError(self, f"cannot find field {field} from unique")
+
+        # Compress with the defaults unless told otherwise, False for not at all
+
+        if self.COMPRESSION is None:
+            self.COMPRESSION = Compression()
+
         return self
 
+    @classmethod
+    def identity(cls):
+        """
+        Identity computed once per class and shared read only after
+        """
+
+        if cls.__dict__.get("_identity") is None:
+            cls._identity = cls.thy(cls.__new__(cls))
+
+        return cls._identity
+
+    @classmethod
+    def forget(cls):
+        """
+        Clears the computed identity, for when a model's fields change
+        """
+
+        cls._identity = None
+
     def endpoints(self):
         """
         Lists the endpoints this resource had
@@ -166,7 +500,7 @@ class ResourceIdentity:
 
         return endpoints
 
-class Resource(flask_restful.Resource, ResourceIdentity):
+class Resource(flask_restful.Resource, ResourceIdentity): # pylint: disable=too-many-public-methods
     """
     Base Model class for Relations Restful classes
     """
@@ -175,9 +509,104 @@ class Resource(flask_restful.Resource, ResourceIdentity):
 
         super(Resource).__init__(*args, **kwargs)
 
-        # Know thyself
+        with self.timed("identity"):
+
+            # Know thyself, computed once, except for callable defaults
+
+            self.__dict__.update(self.identity().__dict__)
+
+            if self._defaults:
+                self._fields = [
+                    {**form_field, "default": self._default(self._defaults[index])} if index in self._defaults else form_field
+                    for index, form_field in enumerate(self._fields)
+                ]
+
+    @classmethod
+    def timed(cls, phase):
+        """
+        Times a phase of the current request, if there is one and it's timed
+        """
+
+        if not cls.TIMING or not flask.has_request_context():
+            return contextlib.nullcontext()
+
+        return Timer.current().phase(phase)
+
+    def one(self, id=None, criteria=None):
+        """
+        Retrieves a model by id, or by criteria, not found if it's not there
+        """
+
+        model = self.MODEL.one(**({self._model._id: id} if criteria is None else criteria))
 
-        self.thy(self)
+        if model.retrieve(False) is None:
+            raise werkzeug.exceptions.NotFound(f"{self._model.NAME}: none retrieved")
+
+        return model
+
+    def dispatch_request(self, *args, **kwargs):
+        """
+        Dispatches as usual, counting queries if set to, then times serializing, compresses, and records it all once the response is made
+        """
+
+        timer = Timer.current() if self.TIMING else None
+        method = flask.request.method.lower()
+
+        queries, token = Queries.start() if self.counting() else (None, None)
+
+        try:
+            response = super().dispatch_request(*args, **kwargs)
+        finally:
+            if token is not None:
+                Queries.stop(token)
+
+        returned = time.perf_counter()
+
+        if queries is not None:
+            self.budget(queries)
+
+        @flask.after_this_request
+        def record(response):
+            if queries is not None:
+                response.headers["X-Query-Count"] = str(len(queries))
+            if timer is not None:
+                timer.add("serialize", (time.perf_counter() - returned) * 1000)
+            if self.COMPRESSION:
+                with self.timed("compress"):
+                    response = self.COMPRESSION.compress(response)
+            if timer is not None:
+                response.headers["Server-Timing"] = timer.header(timer.record(self.SINGULAR, method))
+            return response
+
+        return response
+
+    @classmethod
+    def counting(cls):
+        """
+        Whether to count queries, always with a BUDGET to keep to, else if set to, else when debugging
+        """
+
+        if cls.BUDGET is not None:
+            return True
+
+        counting = flask.current_app.config.get("RELATIONS_RESTFUL_QUERY_COUNT")
+
+        return bool(counting) if counting is not None else flask.current_app.debug
+
+    def budget(self, queries):
+        """
+        Warns if a request made more queries than BUDGET, failing instead when testing
+        """
+
+        if self.BUDGET is None or len(queries) <= self.BUDGET:
+            return
+
+        message = f"{flask.request.method} {flask.request.path} made {len(queries)} queries, over {self.BUDGET}: {queries.counts}"
+
+        if flask.current_app.testing:
+            raise ResourceError(self, message)
+
+        logger.warning(message)
 
     @staticmethod
     def json():
@@ -185,10 +614,7 @@ class Resource(flask_restful.Resource, ResourceIdentity):
         Gets the current request JSON
         """
 
-        try:
-            return flask.request.json
-        except: # pylint: disable=bare-except
-            return {}
+        return ResourceSpec.current().body
 
     @classmethod
     def criteria(cls, verify=False):
@@ -196,22 +622,12 @@ class Resource(flask_restful.Resource, ResourceIdentity):
         Gets criteria from the flask request
         """
 
-        if verify and not flask.request.args and "filter" not in cls.json():
-            raise werkzeug.exceptions.BadRequest("to confirm all, send a blank filter {}")
-
-        criteria = {}
+        spec = ResourceSpec.current()
 
-        if flask.request.args:
-            criteria.update({
-                name: value
-                for name, value in flask.request.args.to_dict().items()
-                if not name.startswith("limit") and name not in ["sort", "count"]
-            })
-
-        if "filter" in cls.json():
-            criteria.update(flask.request.json["filter"])
+        if verify and not spec.args and "filter" not in spec.body:
+            raise werkzeug.exceptions.BadRequest("to confirm all, send a blank filter {}")
 
-        return criteria
+        return dict(spec.filter)
 
     @classmethod
     def sort(cls):
@@ -219,15 +635,7 @@ class Resource(flask_restful.Resource, ResourceIdentity):
         Gets soirt from the flask request
         """
 
-        sort = []
-
-        if flask.request.args and 'sort' in flask.request.args:
-            sort.extend(flask.request.args['sort'].split(','))
-
-        if "sort" in cls.json():
-            sort.extend(flask.request.json['sort'])
-
-        return sort
+        return list(ResourceSpec.current().sort)
 
     @classmethod
     def limit(cls):
@@ -235,184 +643,1379 @@ class Resource(flask_restful.Resource, ResourceIdentity):
         Gets limit from the flask request
         """
 
-        limit = {}
+        return dict(ResourceSpec.current().limit)
 
-        if flask.request.args:
-            limit.update({
-                name.split('__')[-1]: int(value)
-                for name, value in flask.request.args.to_dict().items()
-                if name.startswith("limit")
-            })
+    @classmethod
+    def count(cls):
+        """
+        Gets soirt from the flask request
+        """
+
+        return ResourceSpec.current().count
 
-        if "limit" in cls.json():
-            limit.update({name: int(value) for name, value in flask.request.json["limit"].items()})
+    @classmethod
+    def total(cls):
+        """
+        Gets whether to count along with the page from the flask request
+        """
 
-        return limit
+        return ResourceSpec.current().total
 
     @classmethod
-    def count(cls):
+    def cursor(cls):
         """
-        Gets soirt from the flask request
+        Gets the cursor to seek from from the flask request
         """
 
-        count = False
+        cursor = ResourceSpec.current().cursor
+
+        if cursor is None:
+            return None
 
-        if flask.request.args and 'count' in flask.request.args:
-            count = flask.request.args['count']
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception as exception: # pylint: disable=broad-except
+            raise werkzeug.exceptions.BadRequest("invalid cursor") from exception
 
-        if "count" in cls.json():
-            count = flask.request.json['count']
+        # Any json decodes, but only keys with their values can be sought from
 
-        if isinstance(count, (bool, int)):
-            return count
+        if not isinstance(cursor, dict) or not isinstance(cursor.get("keys"), list) or not isinstance(cursor.get("values"), list):
+            raise werkzeug.exceptions.BadRequest("invalid cursor")
 
-        return count.lower() not in ["0", "no", "false"]
+        return cursor
 
-    def fields(self, likes, values, originals=None):
+    def sparse(self):
         """
-        Apply options and titles to fields
+        Gets the fields to return, if only some, from the flask request
         """
 
-        fields = opengui.Fields(values=values, originals=originals, fields=self._fields)
+        fields = ResourceSpec.current().fields
+
+        if fields is None:
+            return None
 
         for field in fields:
-            relation = self._model._ancestor(field.name)
-            if relation is not None:
-                like = {"like": likes[name] for name in likes if name == field.name}
-                parent = relation.Parent.many(**like).limit()
-                titles = parent.titles()
+            if field not in self._model._fields:
+                raise werkzeug.exceptions.BadRequest(f"unknown field {field}")
 
-                field.content["format"] = titles.format
-                field.content["overflow"] = parent.overflow
+        return list(fields)
 
-                value = field.value if field.value is not None else field.original
+    @staticmethod
+    def trim(values, fields):
+        """
+        Keeps only the fields asked for, if only some were
+        """
 
-                if (not like and value is not None and value not in titles):
-                    titles = relation.Parent.one(**{relation.parent_field: value}).titles()
-                    field.content["overflow"] = True
+        if fields is None:
+            return values
 
-                field.options = titles.ids
-                field.content["titles"] = titles.titles
+        if isinstance(values, list):
+            return [{name: value for name, value in each.items() if name in fields} for each in values]
 
-                field.content.update(like)
+        return {name: value for name, value in values.items() if name in fields}
 
-        return fields
+    @classmethod
+    def formatting(cls):
+        """
+        Gets whether to include formats from the flask request
+        """
 
-    def formats(self, model):
+        return ResourceSpec.current().formats
+
+    @classmethod
+    def stream(cls):
         """
-        Generate all the formats including parent lookups
+        Gets whether to stream, as json or ndjson, from the flask request
         """
 
-        formats = {}
+        stream = ResourceSpec.current().stream
 
-        fields = opengui.Fields(fields=self._fields)
+        if stream is None:
+            stream = cls.STREAM
 
-        for field in model._fields._order:
-            relation = model._ancestor(field.name)
-            if relation is not None:
-                titles = relation.Parent.many(**{f"{relation.parent_field}__in": model[field.name]}).titles()
-                formats[field.name] = {
-                    "titles": titles.titles,
-                    "format": titles.format
-                }
-            elif field.format is not None or "titles" in fields[field.name].content:
-                formats[field.name] = {}
-                if field.format is not None:
-                    formats[field.name]["format"] = field.format
-                if  "titles" in fields[field.name].content:
-                    formats[field.name]["titles"] = fields[field.name].content["titles"]
+        if isinstance(stream, str):
+            stream = stream.lower()
+            if stream in ["json", "ndjson"]:
+                return stream
+            stream = stream not in ["0", "no", "false"]
 
-        return formats
+        return "json" if stream else None
 
-    @exceptions
-    def options(self, id=None):
+    @classmethod
+    def layout(cls):
         """
-        Generates form for inserts or updates of a single record
+        Gets how to lay out lists from the flask request, rows or columns, None for records
         """
 
-        values = self.json().get(self.SINGULAR)
-        likes = self.json().get("likes", {})
+        layout = ResourceSpec.current().layout
 
-        if id is None:
+        if layout is None:
+            return None
 
-            return self.fields(likes, values).to_dict(), 200
+        layout = layout.lower()
 
-        originals = self.MODEL.one(**{self._model._id: id}).export()
+        if layout == "records":
+            return None
 
-        return self.fields(likes, values, originals).to_dict(), 200
+        if layout not in ["rows", "columns"]:
+            raise werkzeug.exceptions.BadRequest(f"unknown layout {layout}")
 
-    @exceptions
-    def post(self):
+        return layout
+
+    def heading(self, fields):
         """
-        Creates one or more models
+        Names of the fields to export as rows, in field order
         """
 
-        if "filter" in self.json():
+        return [field.name for field in self._model._fields._order if fields is None or field.name in fields]
 
-            return self.get()
+    @staticmethod
+    def tabulate(models, fields):
+        """
+        Exports models as rows of values, in field order, without building a dict for each
+        """
 
-        if self.SINGULAR in self.json():
+        return [
+            [field.export() for field in model._record._order if fields is None or field.name in fields]
+            for model in models._models or []
+        ]
 
-            return {self.SINGULAR: self.MODEL(**flask.request.json[self.SINGULAR]).create().export()}, 201
+    @classmethod
+    def exporting(cls):
+        """
+        Gets what to export as from the flask request, csv or ndjson, also csv if it's what's accepted
+        """
 
-        if self.PLURAL in self.json():
+        export = ResourceSpec.current().export
 
-            return {self.PLURAL: self.MODEL(flask.request.json[self.PLURAL]).create().export()}, 201
+        if export is None:
+            if flask.request.accept_mimetypes.best_match(["application/json", "text/csv"]) == "text/csv":
+                return "csv"
+            return None
 
-        raise werkzeug.exceptions.BadRequest(f"either {self.SINGULAR} or {self.PLURAL} required")
+        export = export.lower()
 
-    @exceptions
-    def get(self, id=None):
+        if export not in ["csv", "ndjson"]:
+            raise werkzeug.exceptions.BadRequest(f"unknown export {export}")
+
+        return export
+
+    @classmethod
+    def bulk(cls):
         """
-        Retrieves one or more models
+        Gets whether to create in batches from the flask request, always so for ndjson
         """
 
-        if id is not None:
-            model = self.MODEL.one(**{self._model._id: id})
-            return {self.SINGULAR: model.export(), "formats": self.formats(model)}
+        return ResourceSpec.current().bulk
 
-        models = self.MODEL.many(**self.criteria()).sort(*self.sort()).limit(**self.limit())
+    def items(self):
+        """
+        Gets items to create one at a time, from ndjson lines as they're read, else the plural list
+        """
 
-        if self.count():
-            return {self.PLURAL: models.count(), "overflow": models.overflow}, 200
+        if flask.request.mimetype != "application/x-ndjson":
+            yield from self.json().get(self.PLURAL, [])
+            return
 
-        return {self.PLURAL: models.export(), "overflow": models.overflow, "formats": self.formats(models)}, 200
+        for line in flask.request.stream:
 
-    @exceptions
-    def patch(self, id=None):
+            if not line.strip():
+                continue
+
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield werkzeug.exceptions.BadRequest("invalid json")
+
+    def batch(self, batch):
         """
-        Updates models
+        Creates a batch of indexed items together, building each first so the bad ones fail alone
         """
 
-        if self.SINGULAR not in self.json() and self.PLURAL not in self.json():
-            raise werkzeug.exceptions.BadRequest(f"either {self.SINGULAR} or {self.PLURAL} required")
+        results = {}
+        valid = []
 
-        if id is not None:
+        # Building checks every value, so what's wrong with an item is found before creating any
 
-            model = self.MODEL.one(**{self._model._id: id}).set(**flask.request.json[self.SINGULAR])
+        for index, item in batch:
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                self.MODEL(**item)
+                valid.append((index, item))
+            except Exception as exception: # pylint: disable=broad-except
+                results[index] = {"index": index, "status": 400, "message": getattr(exception, "description", str(exception))}
 
-        elif self.SINGULAR in flask.request.json:
+        # Retrying alone after the create fails could create some twice, so they all fail with it
 
-            model = self.MODEL.one(**self.criteria(True)).set(**flask.request.json[self.SINGULAR])
+        if valid:
 
-        elif self.PLURAL in flask.request.json:
+            try:
+                created = self.MODEL([item for _, item in valid]).create().export()
+            except Exception as exception: # pylint: disable=broad-except
+                log(exception)
+                created = None
+                for index, _ in valid:
+                    results[index] = {"index": index, "status": 500, "message": str(exception)}
 
-            model = self.MODEL.many(**self.criteria(True)).set(**flask.request.json[self.PLURAL])
+            if created is not None:
 
-        return {"updated": model.update()}, 202
+                for (index, _), model in zip(valid, created):
+                    results[index] = {"index": index, "status": 201}
+                    if self._model._id is not None:
+                        results[index]["id"] = model[self._model._id]
 
-    @exceptions
-    def delete(self, id=None):
+                self.invalidate([results[index].get("id") for index, _ in valid])
+
+        return [results[index] for index, _ in batch]
+
+    def ingest(self, items):
         """
-        Deletes models
+        Creates items in batches of BULK, or the model's chunk, with a result for each
         """
 
-        if id is not None:
+        size = self.BULK or self._model.CHUNK
 
-            model = self.MODEL.one(**{self._model._id: id})
+        results = []
+        batch = []
 
-        else:
+        for index, item in enumerate(items):
 
-            model = self.MODEL.many(**self.criteria(True))
+            batch.append((index, item))
+
+            if len(batch) >= size:
+                results.extend(self.batch(batch))
+                batch = []
+
+        if batch:
+            results.extend(self.batch(batch))
+
+        failed = len([result for result in results if result["status"] != 201])
+
+        return {self.PLURAL: results, "created": len(results) - failed, "failed": failed}, 207 if failed else 201
+
+    def amend(self, items):
+        """
+        Updates rows by id with their own changes, rows with the same changes together in batches
+        """
+
+        if self._model._id is None:
+            raise werkzeug.exceptions.BadRequest(f"{self.PLURAL} need an id to update as a list")
+
+        size = self.BULK or self._model.CHUNK
+        groups = {}
+
+        for item in items:
+
+            if not isinstance(item, dict) or self._model._id not in item or not isinstance(item.get("changes"), dict):
+                raise werkzeug.exceptions.BadRequest(f"each of {self.PLURAL} needs {self._model._id} and changes")
+
+            # Building checks the id and changes, so a bad item stops them all before any update
+
+            try:
+                self.MODEL(**{**item["changes"], self._model._id: item[self._model._id]})
+            except Exception as exception:
+                raise werkzeug.exceptions.BadRequest(f"{self.PLURAL} {item[self._model._id]}: {exception}") from exception
+
+            key = json.dumps(item["changes"], sort_keys=True, default=str)
+            groups.setdefault(key, (item["changes"], []))[1].append(item[self._model._id])
+
+        batches = []
+
+        for changes, ids in groups.values():
+            for start in range(0, len(ids), size):
+                batch = ids[start:start + size]
+                updated = self.MODEL.many(**{f"{self._model._id}__in": batch}).set(**changes).update()
+                self.invalidate(batch)
+                batches.append({"ids": batch, "updated": updated})
+
+        return {"updated": sum(batch["updated"] for batch in batches), "batches": batches}, 202
+
+    def upsert(self, items, unique=None): # pylint: disable=too-many-locals
+        """
+        Creates or updates items matched on unique fields, finding all at once and creating all at once,
+        failing those with ids that match nothing when ids are generated, as they can't be created as sent
+        """
+
+        unique = unique or self.UNIQUE
+
+        if not unique:
+            raise werkzeug.exceptions.BadRequest(f"{self.PLURAL} need an id or unique fields to upsert")
+
+        # Building each checks the values and converts them, so they match what's stored
+
+        keys = []
+        auto = []
+
+        for item in items:
+            model = self.MODEL(**item)
+            keys.append(tuple(model[field] for field in unique) if all(model[field] is not None for field in unique) else None)
+            auto.append(self._model._id is not None and model._fields._names[self._model._id].auto and model[self._model._id] is not None)
+
+        found = None
+        existing = {}
+        values = list(dict.fromkeys(key[0] for key in keys if key is not None))
+
+        if values:
+            found = self.MODEL.many(**{f"{unique[0]}__in": values})
+            existing = {tuple(model[field] for field in unique): model for model in found}
+
+        matched = {}
+        pending = {}
+        places = []
+        failed = []
+
+        for index, (item, key) in enumerate(zip(items, keys)):
+            if key in existing:
+                existing[key].set(**{name: value for name, value in item.items() if name != self._model._id})
+                matched[key] = existing[key]
+                places.append(("updated", key))
+            elif auto[index]:
+                failed.append({"index": index, "status": 404, "message": f"{self._model.NAME}: none retrieved"})
+            else:
+                key = key if key is not None else index
+                pending.setdefault(key, {}).update(item)
+                places.append(("created", key))
+
+        if matched:
+            found.update()
+
+        created = {}
+
+        if pending:
+            created = dict(zip(pending, self.MODEL(list(pending.values())).create()))
+
+        models = [matched[key] if place == "updated" else created[key] for place, key in places]
+
+        if self._model._id is not None:
+            self.invalidate(list(dict.fromkeys(model[self._model._id] for model in models)))
+        else:
+            self.invalidate()
+
+        return [model.export() for model in models], len(created), len(matched), failed
+
+    def plan(self, fields, likes):
+        """
+        Collects all the parent lookups needed for fields, by parent
+        """
+
+        plan = {}
+
+        for field in fields:
+
+            relation = self._model._ancestor(field.name)
+
+            if relation is None:
+                continue
+
+            lookup = plan.setdefault((relation.Parent, relation.parent_field), {
+                "relation": relation,
+                "pages": {},
+                "values": [],
+                "titles": None
+            })
+
+            like = likes.get(field.name)
+            lookup["pages"][like] = None
+
+            value = field.value if field.value is not None else field.original
+
+            if like is None and value is not None and value not in lookup["values"]:
+                lookup["values"].append(value)
+
+        return plan
+
+    def gather(self, calls):
+        """
+        Runs independent lookups, in the executor if there is one, returning their results by the same keys
+        """
+
+        if self.EXECUTOR is None or len(calls) < 2:
+            return {key: call() for key, call in calls.items()}
+
+        # Each lookup gets its own copy of the context so it still has the request
+
+        futures = {key: self.EXECUTOR.submit(contextvars.copy_context().run, call) for key, call in calls.items()}
+
+        # One deadline for them all, rather than each getting TIMEOUT in turn
+
+        _, pending = concurrent.futures.wait(futures.values(), timeout=self.TIMEOUT)
+
+        # Those still queued are cancelled, but those already running can't be stopped,
+        # so they finish in the background, holding their workers, with their results dropped
+
+        if pending:
+
+            for future in pending:
+                future.cancel()
+
+            raise werkzeug.exceptions.GatewayTimeout("lookups timed out")
+
+        return {key: future.result() for key, future in futures.items()}
+
+    def look(self, lookup):
+        """
+        Runs a planned parent lookup, a page per like and all out of page values at once
+        """
+
+        relation = lookup["relation"]
+
+        for like in lookup["pages"]:
+            parent = relation.Parent.many(**({} if like is None else {"like": like})).limit()
+            titles = parent.titles()
+            lookup["pages"][like] = (titles, parent.overflow)
+            self.known(self._parents[relation.child_field]).update({**titles.titles, None: titles.format})
+            if self.CACHE is not None:
+                self.CACHE.update(self._parents[relation.child_field], {**titles.titles, None: titles.format})
+
+        titles = lookup["pages"].get(None, (None, None))[0]
+        values = [value for value in lookup["values"] if titles is None or value not in titles]
+
+        if values:
+            lookup["titles"] = self.titles(relation, values)
+
+        return lookup
+
+    def lookup(self, plan):
+        """
+        Runs all the planned parent lookups, each parent independent of the others
+        """
+
+        self.gather({key: functools.partial(self.look, lookup) for key, lookup in plan.items()})
+
+        return plan
+
+    def fields(self, likes, values, originals=None):
+        """
+        Apply options and titles to fields
+        """
+
+        fields = opengui.Fields(values=values, originals=originals, fields=self._fields)
+
+        plan = self.lookup(self.plan(fields, likes))
+
+        for field in fields:
+            relation = self._model._ancestor(field.name)
+            if relation is not None:
+                lookup = plan[(relation.Parent, relation.parent_field)]
+                like = {"like": likes[name] for name in likes if name == field.name}
+                titles, overflow = lookup["pages"][likes.get(field.name)]
+
+                field.content["format"] = titles.format
+                field.content["overflow"] = overflow
+                field.options = titles.ids
+                field.content["titles"] = titles.titles
+
+                value = field.value if field.value is not None else field.original
+
+                if (not like and value is not None and value not in titles):
+
+                    if lookup["titles"] is None or value not in lookup["titles"]["titles"]:
+                        raise werkzeug.exceptions.NotFound(f"{relation.Parent.thy().NAME}: none retrieved")
+
+                    field.content["overflow"] = True
+                    field.options = [value]
+                    field.content["titles"] = {value: lookup["titles"]["titles"][value]}
+
+                field.content.update(like)
+
+        return fields
+
+    def known(self, name):
+        """
+        Parent titles already looked up this request, by id, if there is a request
+        """
+
+        if not flask.has_request_context():
+            return {}
+
+        return ResourceSpec.current().titles.setdefault(name, {})
+
+    def titles(self, relation, ids):
+        """
+        Gets titles and format for parent ids, from this request, the cache, then the parent
+        """
+
+        if not isinstance(ids, list):
+            ids = [ids]
+
+        name = self._parents[relation.child_field]
+        ids = list(dict.fromkeys(id for id in ids if id is not None))
+
+        # The format is kept under None, which is never an id
+
+        known = self.known(name)
+        missing = [id for id in [None] + ids if id not in known]
+
+        if missing and self.CACHE is not None:
+            known.update(self.CACHE.many(name, missing))
+            missing = [id for id in missing if id not in known]
+
+        if missing:
+            titles = relation.Parent.many(**{f"{relation.parent_field}__in": [id for id in missing if id is not None]}).titles()
+            known.update({**titles.titles, None: titles.format})
+            if self.CACHE is not None:
+                self.CACHE.update(name, {**titles.titles, None: titles.format})
+
+        return {
+            "titles": {id: known[id] for id in ids if id in known},
+            "format": known[None]
+        }
+
+    def invalidate(self, ids=None):
+        """
+        Invalidates cached titles of this model in every cache, all of them if no ids,
+        and all its cached responses, and its descendants', as their formats have its titles
+        """
+
+        Cache.invalidate(self._model.NAME, ids if self._model._id is not None else None)
+
+        names = [self._model.NAME]
+        models = [self._model]
+
+        while models:
+            for relation in models.pop().CHILDREN.values():
+                child = relation.Child.thy()
+                if child.NAME not in names:
+                    names.append(child.NAME)
+                    models.append(child)
+
+        for name in names:
+            Cache.invalidate(f"{name}:responses")
+
+    def recall(self, id=None):
+        """
+        Gets a cached response and its ETag for the request, if caching responses
+        """
+
+        if self.RESPONSES is None:
+            return None
+
+        key = ResourceSpec.current().key(self.responding(), id)
+
+        return self.RESPONSES.many(f"{self._model.NAME}:responses", [key]).get(key)
+
+    def remember(self, id, response, etag):
+        """
+        Caches a response and its ETag for the request, if caching responses
+        """
+
+        if self.RESPONSES is not None:
+            self.RESPONSES.update(f"{self._model.NAME}:responses", {ResourceSpec.current().key(self.responding(), id): (response, etag)})
+
+    @classmethod
+    def responding(cls):
+        """
+        Which resource cached a response, as others on the same model can respond differently
+        """
+
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    @staticmethod
+    def digest(payload):
+        """
+        Strong hash of a payload for an ETag
+        """
+
+        return hashlib.sha1(json.dumps(payload, default=str).encode()).hexdigest()
+
+    def etag(self, model):
+        """
+        ETag for a single record, from its VERSION field if set, else all its values
+        """
+
+        if self.VERSION is not None:
+            return self.digest([model[self._model._id], model[self.VERSION]])
+
+        return self.digest(model.export())
+
+    @classmethod
+    def variant(cls, etag, fields, formats):
+        """
+        ETag for a representation of a record, its ETag then a digest of the fields and formats with it
+        """
+
+        return f"{etag}.{cls.digest([fields, formats])}"
+
+    @staticmethod
+    def plain(etag):
+        """
+        ETag without the suffixes encodings add, like abc-msgpack-gzip to abc, as ETags here are hex digests
+        """
+
+        return etag.split("-", 1)[0]
+
+    @classmethod
+    def unmodified(cls, etag):
+        """
+        Whether the client already has this ETag in any encoding, as a 304 response with what it sent if so
+        """
+
+        sent = flask.request.if_none_match
+
+        if sent.star_tag:
+            return flask.Response(status=304, headers={"ETag": werkzeug.http.quote_etag(etag)})
+
+        for each in sent.as_set(include_weak=True):
+            if cls.plain(each) == etag:
+                return flask.Response(status=304, headers={"ETag": werkzeug.http.quote_etag(each)})
+
+        return None
+
+    def tag(self, response):
+        """
+        ETag from the serialized body, before it's compressed, as a 304 response if the client has it
+        """
+
+        if response.status_code != 200 or response.is_streamed or "ETag" in response.headers:
+            return response
+
+        response.add_etag()
+
+        unmodified = self.unmodified(response.get_etag()[0])
+
+        return unmodified if unmodified is not None else response
+
+    def match(self, model):
+        """
+        Makes sure a record hasn't changed if the request has If-Match, with an ETag from any encoding
+        """
+
+        sent = flask.request.if_match
+
+        # Any representation of the record will do, so only what's before the fields and formats counts
+
+        if sent and not sent.star_tag and self.etag(model) not in [self.plain(each).split(".", 1)[0] for each in sent]:
+            raise werkzeug.exceptions.PreconditionFailed(f"{self.SINGULAR} has changed")
+
+    def formats(self, model, only=None):
+        """
+        Generate all the formats including parent lookups, for only some fields if sent
+        """
+
+        formats = {}
+        calls = {}
+
+        for field in model._fields._order:
+            if only is not None and field.name not in only:
+                continue
+            relation = model._ancestor(field.name)
+            if relation is not None:
+                formats[field.name] = None
+                calls[field.name] = functools.partial(self.titles, relation, model[field.name])
+            elif field.name in self._formats:
+                formats[field.name] = self._formats[field.name]
+
+        formats.update(self.gather(calls))
+
+        return formats
+
+    def keys(self, sort):
+        """
+        Full sort, with the id added so pages are consistent
+        """
+
+        keys = self._model._ordering(sort or self._model._order or [])
+
+        if self._model._id is not None and self._model._id not in [key[1:] for key in keys]:
+            keys.append(f"+{self._model._id}")
+
+        return keys
+
+    def position(self, keys, model):
+        """
+        Cursor to seek past a model with these keys, as the keys and the model's values for them
+        """
+
+        # Fields of kinds JSON can't hold go as they're exported, like IPv4Address as a dict
+
+        exported = model.export()
+        values = []
+
+        for key in keys:
+            if key[1:] in exported:
+                values.append(exported[key[1:]])
+            else:
+                values.append(model[key[1:]])
+
+        return {
+            "keys": keys,
+            "values": values
+        }
+
+    def marker(self, keys, model):
+        """
+        Opaque cursor to seek past a model with these keys
+        """
+
+        return base64.urlsafe_b64encode(json.dumps(self.position(keys, model)).encode()).decode()
+
+    def unmark(self, keys, values):
+        """
+        Cursor values back as their fields have them, undoing the exporting marker() does
+        """
+
+        unmarked = []
+
+        for key, value in zip(keys, values):
+            if key[1:] in self._model._fields._names:
+                unmarked.append(self._model._fields._names[key[1:]].valid(value))
+            else:
+                unmarked.append(value)
+
+        return unmarked
+
+    def seek(self, cursor, criteria, keys, limit):
+        """
+        Retrieves the page after a cursor, seeking rather than offsetting
+        """
+
+        if cursor.get("keys") != keys:
+            raise werkzeug.exceptions.BadRequest("cursor doesn't match sort")
+
+        try:
+            values = self.unmark(keys, cursor["values"])
+        except Exception as exception: # pylint: disable=broad-except
+            raise werkzeug.exceptions.BadRequest("invalid cursor") from exception
+
+        size = limit.get("per_page", limit.get("limit", self._model.CHUNK))
+        models = None
+
+        # Everything after (a, b, c) is a = a and b = b and c > c, then a = a and b > b,
+        # then a > a, so seek each of those in turn until the page is full
+
+        for index in reversed(range(len(keys))):
+
+            seek = dict(criteria)
+
+            for key, value in zip(keys[:index], values[:index]):
+                seek[f"{key[1:]}__eq"] = value
+
+            seek[f"{keys[index][1:]}__{'gt' if keys[index][0] == '+' else 'lt'}"] = values[index]
+
+            page = self.MODEL.many(**seek).sort(*keys[index:]).limit(size - (len(models._models) if models else 0))
+            page.export()
+
+            if models is None:
+                models = page
+            else:
+                models._models.extend(page._models)
+
+            if len(models._models) >= size:
+                break
+
+        models.overflow = len(models._models) >= size
+
+        return models
+
+    def counted(self, models, criteria, limit, cursor=None):
+        """
+        Total matching the criteria, from the page itself if it's the last, else counted
+        """
+
+        size = limit.get("per_page", limit.get("limit", self._model.CHUNK))
+        offset = (limit["page"] - 1) * size if "page" in limit else limit.get("start", 0)
+
+        # A partial page with a known offset already says how many there are
+
+        if cursor is None and not models.overflow and len(models) < size and (len(models) or not offset):
+            return offset + len(models)
+
+        return self.MODEL.many(**criteria).count()
+
+    def checked(self, criteria, sort):
+        """
+        Builds the sort and query without running either, so bad ones fail before a stream starts
+        """
+
+        keys = self.keys(sort)
+
+        self.MODEL.many(**criteria)
+
+        return keys
+
+    def chunks(self, criteria, sort, limit):
+        """
+        Retrieves models a chunk at a time, within the limit if there is one, seeking past the last
+        of each chunk rather than offsetting, so later chunks cost no more than the first
+        """
+
+        keys = self.keys(sort)
+
+        size = self._model.CHUNK
+        remaining = None
+        offset = 0
+
+        if limit is not None:
+            remaining = limit.get("per_page", limit.get("limit", size))
+            offset = (limit["page"] - 1) * remaining if "page" in limit else limit.get("start", 0)
+
+        models = None
+
+        while remaining is None or remaining > 0:
+
+            chunk = size if remaining is None else min(size, remaining)
+
+            # Without an id the keys might not be unique, so seeking could skip ties
+
+            if models is None or self._model._id is None:
+                models = self.MODEL.many(**criteria).sort(*keys).limit(chunk, start=offset)
+                models.export()
+            else:
+                models = self.seek(self.position(keys, models._models[-1]), criteria, keys, {"limit": chunk})
+
+            yield models
+
+            if len(models) < chunk:
+                break
+
+            offset += chunk
+
+            if remaining is not None:
+                remaining -= chunk
+
+    def streamed(self, stream, criteria, sort, limit, fields=None, layout=None): # pylint: disable=too-many-arguments
+        """
+        Streams models as a json envelope or as ndjson, a chunk at a time, as records or rows
+        """
+
+        def generate(): # pylint: disable=too-many-branches
+
+            overflow = False
+            formats = {} if self.formatting() else None
+            delimiter = ""
+
+            names = self.heading(fields) if layout == "rows" else None
+
+            if stream == "json" and names is not None:
+                yield f'{{{json.dumps(self.PLURAL)}: {{"fields": {json.dumps(names)}, "rows": ['
+            elif stream == "json":
+                yield f'{{{json.dumps(self.PLURAL)}: ['
+            elif names is not None:
+                yield f"{json.dumps(names)}\n"
+
+            for models in self.chunks(criteria, sort, limit):
+
+                exported = self.tabulate(models, fields) if names is not None else self.trim(models.export(), fields)
+
+                for values in exported:
+                    if stream == "json":
+                        yield f"{delimiter}{json.dumps(values)}"
+                        delimiter = ", "
+                    else:
+                        yield f"{json.dumps(values)}\n"
+
+                if stream == "json" and formats is not None:
+                    for name, format in self.formats(models, fields).items():
+                        formats.setdefault(name, {}).update({key: value for key, value in format.items() if key != "titles"})
+                        if "titles" in format:
+                            formats[name].setdefault("titles", {}).update(format["titles"])
+
+                overflow = models.overflow
+
+            close = "]}" if names is not None else "]"
+
+            if stream == "json" and formats is not None:
+                yield f'{close}, "overflow": {json.dumps(overflow)}, "formats": {json.dumps(formats)}}}\n'
+            elif stream == "json":
+                yield f'{close}, "overflow": {json.dumps(overflow)}}}\n'
+
+        # Once the response starts its status is sent, so anything that'd fail has to first
+
+        self.checked(criteria, sort)
+
+        mimetype = "application/json" if stream == "json" else "application/x-ndjson"
+
+        return flask.Response(flask.stream_with_context(generate()), mimetype=mimetype)
+
+    @staticmethod
+    def cell(value):
+        """
+        Converts a value for a csv cell, with anything structured as json
+        """
+
+        if value is None:
+            return ""
+
+        if isinstance(value, (bool, list, dict)):
+            return json.dumps(value)
+
+        return value
+
+    def exported(self, export, criteria, sort, limit=None, titled=False): # pylint: disable=too-many-arguments
+        """
+        Streams models in LIST order as csv or ndjson, a chunk at a time as chunks() seeks them, with their parents' titles if titled
+        """
+
+        parents = [field for field in self.LIST if titled and self._model._ancestor(field) is not None]
+        names = self.LIST + [f"{field}_title" for field in parents]
+
+        def value(exported, field):
+
+            if "__" not in field:
+                return exported[field]
+
+            name, path = field.split("__", 1)
+
+            return self._model._fields._names[name].get(exported[name], path)
+
+        def generate():
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            if export == "csv":
+                writer.writerow(names)
+
+            for models in self.chunks(criteria, sort, limit):
+
+                # Titles are looked up a chunk at a time, and not kept for the next so memory stays level
+
+                titles = {
+                    field: self.titles(self._model._ancestor(field), models[field])["titles"]
+                    for field in parents
+                }
+
+                ResourceSpec.current().titles.clear()
+
+                for exported in models.export():
+
+                    values = [value(exported, field) for field in self.LIST] + [
+                        " ".join(str(title) for title in titles[field].get(exported[field], []) if title is not None)
+                        for field in parents
+                    ]
+
+                    if export == "csv":
+                        writer.writerow([self.cell(each) for each in values])
+                    else:
+                        buffer.write(f"{json.dumps(dict(zip(names, values)))}\n")
+
+                yield buffer.getvalue()
+
+                buffer.seek(0)
+                buffer.truncate()
+
+            # Only the header's left if there were no chunks at all
+
+            if buffer.tell():
+                yield buffer.getvalue()
+
+        self.checked(criteria, sort)
+
+        if export == "csv":
+            return flask.Response(
+                flask.stream_with_context(generate()),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{self.PLURAL}.csv"'}
+            )
+
+        return flask.Response(flask.stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    @exceptions
+    def options(self, id=None):
+        """
+        Generates form for inserts or updates of a single record
+        """
+
+        values = self.json().get(self.SINGULAR)
+        likes = self.json().get("likes", {})
+
+        if id is None:
+
+            return self.fields(likes, values).to_dict(), 200
+
+        originals = self.one(id).export()
+
+        return self.fields(likes, values, originals).to_dict(), 200
+
+    @exceptions
+    def post(self):
+        """
+        Creates one or more models
+        """
+
+        if self.bulk():
+
+            return self.ingest(self.items())
+
+        if "filter" in self.json():
+
+            return self.get()
+
+        if self.SINGULAR in self.json():
+
+            created = self.MODEL(**self.json()[self.SINGULAR]).create().export()
+            self.invalidate([created.get(self._model._id)])
+
+            return {self.SINGULAR: created}, 201
+
+        if self.PLURAL in self.json():
+
+            created = self.MODEL(self.json()[self.PLURAL]).create().export()
+            self.invalidate([model.get(self._model._id) for model in created])
+
+            return {self.PLURAL: created}, 201
+
+        raise werkzeug.exceptions.BadRequest(f"either {self.SINGULAR} or {self.PLURAL} required")
+
+    def page(self):
+        """
+        Retrieves the page of models, or their count, the request asks for
+        """
+
+        keys = self.keys(self.sort())
+        cursor = self.cursor()
+
+        if self.count():
+            with self.timed("count"):
+                models = self.MODEL.many(**self.criteria()).sort(*keys).limit(**self.limit())
+                return {self.PLURAL: models.count(), "overflow": models.overflow}
+
+        with self.timed("query"):
+            if cursor is not None:
+                models = self.seek(cursor, self.criteria(), keys, self.limit())
+            else:
+                models = self.MODEL.many(**self.criteria()).sort(*keys).limit(**self.limit())
+                models.retrieve()
+
+        fields = self.sparse()
+        layout = self.layout()
+
+        with self.timed("export"):
+
+            if layout is None:
+                exported = self.trim(models.export(), fields)
+            else:
+                names = self.heading(fields)
+                rows = self.tabulate(models, fields)
+                if layout == "rows":
+                    exported = {"fields": names, "rows": rows}
+                else:
+                    exported = {"fields": names, "columns": [list(column) for column in zip(*rows)] or [[] for name in names]}
+
+            response = {
+                self.PLURAL: exported,
+                "overflow": models.overflow
+            }
+
+        if self.formatting():
+            with self.timed("formats"):
+                response["formats"] = self.formats(models, fields)
+
+        if self.total():
+            with self.timed("count"):
+                response["total"] = self.counted(models, self.criteria(), self.limit(), cursor)
+
+        if models.overflow and self._model._id is not None and models._models:
+            response["next"] = self.marker(keys, models._models[-1])
+
+        return response
+
+    @exceptions
+    def get(self, id=None):
+        """
+        Retrieves one or more models
+        """
+
+        if id is None:
+
+            export = self.exporting()
+
+            if export is not None:
+                return self.exported(export, self.criteria(), self.sort(), self.limit() or None, ResourceSpec.current().titled)
+
+            stream = self.stream()
+
+            if stream and not self.count():
+
+                layout = self.layout()
+
+                if layout == "columns":
+                    raise werkzeug.exceptions.BadRequest("columns can't be streamed, only rows")
+
+                return self.streamed(stream, self.criteria(), self.sort(), self.limit(), self.sparse(), layout)
+
+        cached = self.recall(id)
+
+        if cached is not None:
+
+            response, etag = cached
+
+        elif id is not None:
+
+            fields = self.sparse()
+
+            with self.timed("query"):
+                model = self.one(id)
+
+            etag = self.etag(model)
+            formatting = self.formatting()
+
+            # Without formats the record is all there is, so the client might already have it
+
+            if not formatting:
+
+                etag = self.variant(etag, fields, None)
+                unmodified = self.unmodified(etag)
+
+                if unmodified is not None:
+                    return unmodified
+
+            with self.timed("export"):
+                response = {self.SINGULAR: self.trim(model.export(), fields)}
+
+            # Formats have the parents' titles, which change without the record, so they're tagged too
+
+            if formatting:
+                with self.timed("formats"):
+                    response["formats"] = self.formats(model, fields)
+                etag = self.variant(etag, fields, response["formats"])
+
+            self.remember(id, response, etag)
+
+        else:
+
+            response = self.page()
+            etag = None
+            self.remember(id, response, etag)
+
+        # Lists have nothing cheaper than their body to tag, so tag that once it's serialized
+
+        if etag is None:
+            flask.after_this_request(self.tag)
+            return response
+
+        unmodified = self.unmodified(etag)
+
+        if unmodified is not None:
+            return unmodified
+
+        return response, 200, {"ETag": werkzeug.http.quote_etag(etag)}
+
+    @exceptions
+    def put(self, id=None):
+        """
+        Creates or updates models, matching by id or unique fields
+        """
+
+        if self.SINGULAR in self.json():
+
+            if id is not None:
+                values = {**self.json()[self.SINGULAR], self._model._id: id}
+                upserted, created, _, failed = self.upsert([values], [self._model._id])
+            else:
+                upserted, created, _, failed = self.upsert([self.json()[self.SINGULAR]])
+
+            if failed:
+                raise werkzeug.exceptions.NotFound(failed[0]["message"])
+
+            return {self.SINGULAR: upserted[0]}, 201 if created else 200
+
+        if self.PLURAL in self.json():
+
+            upserted, created, updated, failed = self.upsert(self.json()[self.PLURAL])
+
+            response = {self.PLURAL: upserted, "created": created, "updated": updated}
+
+            if failed:
+                response["failed"] = failed
+
+            return response, 207 if failed else 200
+
+        raise werkzeug.exceptions.BadRequest(f"either {self.SINGULAR} or {self.PLURAL} required")
+
+    @exceptions
+    def patch(self, id=None):
+        """
+        Updates models
+        """
+
+        if self.SINGULAR not in self.json() and self.PLURAL not in self.json():
+            raise werkzeug.exceptions.BadRequest(f"either {self.SINGULAR} or {self.PLURAL} required")
+
+        if id is None and isinstance(self.json().get(self.PLURAL), list):
+
+            return self.amend(self.json()[self.PLURAL])
+
+        ids = None
+
+        if id is not None:
+
+            model = self.one(id)
+            self.match(model)
+            model.set(**self.json()[self.SINGULAR])
+            ids = [model[self._model._id]]
+
+        elif self.SINGULAR in self.json():
+
+            model = self.one(criteria=self.criteria(True)).set(**self.json()[self.SINGULAR])
+
+        elif self.PLURAL in self.json():
+
+            model = self.MODEL.many(**self.criteria(True)).set(**self.json()[self.PLURAL])
+
+        updated = model.update()
+        self.invalidate(ids)
+
+        return {"updated": updated}, 202
+
+    @exceptions
+    def delete(self, id=None):
+        """
+        Deletes models
+        """
+
+        ids = None
+
+        if id is not None:
+
+            model = self.one(id)
+            self.match(model)
+
+        else:
+
+            model = self.MODEL.many(**self.criteria(True))
+
+        deleted = model.delete()
+
+        if id is not None:
+            ids = [model[self._model._id]]
+
+        self.invalidate(ids)
+
+        return {"deleted": deleted}, 202
+
+def synchronous(method):
+    """
+    Makes an async method callable by flask_restful, which calls methods directly
+    """
+
+    return flask.current_app.ensure_sync(method)
+
+class AsyncResource(Resource):
+    """
+    Resource with async methods, running queries in threads and parent lookups concurrently
+    """
+
+    method_decorators = [synchronous]
+
+    _loop = None
+
+    async def threaded(self, method, *args, **kwargs):
+        """
+        Runs a sync method in a thread with the request, keeping the loop for lookups
+        """
+
+        self._loop = asyncio.get_running_loop()
+
+        run = functools.partial(contextvars.copy_context().run, method, self, *args, **kwargs)
+
+        return await self._loop.run_in_executor(None, run)
+
+    def gather(self, calls):
+        """
+        Runs independent lookups concurrently on the request's loop, if it's still going
+        """
+
+        try:
+            asyncio.get_running_loop()
+            running = True
+        except RuntimeError:
+            running = False
+
+        # On the loop itself, or after it's gone, like while streaming, run them in turn
+
+        if running or self._loop is None or not self._loop.is_running() or len(calls) < 2:
+            return super().gather(calls)
+
+        runs = {key: functools.partial(contextvars.copy_context().run, call) for key, call in calls.items()}
+
+        return asyncio.run_coroutine_threadsafe(self.gathered(runs), self._loop).result()
+
+    async def gathered(self, runs):
+        """
+        Runs each lookup in its own thread, returning their results by the same keys
+        """
+
+        loop = asyncio.get_running_loop()
+
+        results = await asyncio.gather(*(loop.run_in_executor(None, run) for run in runs.values()))
+
+        return dict(zip(runs, results))
+
+    async def options(self, id=None): # pylint: disable=invalid-overridden-method
+        """
+        Generates form for inserts or updates of a single record
+        """
+
+        return await self.threaded(Resource.options, id)
+
+    async def post(self): # pylint: disable=invalid-overridden-method
+        """
+        Creates one or more models
+        """
+
+        specified = self.specified()
+
+        if specified is not None:
+            return specified
+
+        if "filter" in self.json():
+
+            return await self.get()
+
+        return await self.threaded(Resource.post)
+
+    @exceptions
+    def specified(self):
+        """
+        Reads the request before a post checks it for a filter, None if it's fine,
+        reading here so errors still get their error bodies
+        """
+
+        ResourceSpec.current()
+
+    async def get(self, id=None): # pylint: disable=invalid-overridden-method
+        """
+        Retrieves one or more models
+        """
+
+        deferred = self.deferred(id)
+
+        if deferred is not None:
+            return deferred
+
+        return await self.threaded(Resource.get, id)
+
+    @exceptions
+    def deferred(self, id=None):
+        """
+        Streams or exports as is, without a thread, as they don't query until iterated and have to keep the request,
+        None if neither, checking what's asked for here so errors still get their error bodies
+        """
+
+        if id is None and (self.exporting() or (self.stream() and not self.count())):
+            return Resource.get(self, id)
+
+        return None
+
+    async def put(self, id=None): # pylint: disable=invalid-overridden-method
+        """
+        Creates or updates models, matching by id or unique fields
+        """
+
+        return await self.threaded(Resource.put, id)
+
+    async def patch(self, id=None): # pylint: disable=invalid-overridden-method
+        """
+        Updates models
+        """
+
+        return await self.threaded(Resource.patch, id)
+
+    async def delete(self, id=None): # pylint: disable=invalid-overridden-method
+        """
+        Deletes models
+        """
 
-        return {"deleted": model.delete()}, 202
+        return await self.threaded(Resource.delete, id)
@@ -0,0 +1,183 @@
+"""
+Timing module for Relations RESTful
+"""
+
+import time
+import bisect
+import logging
+import itertools
+import threading
+import contextlib
+import collections
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    """
+    Latencies counted by bucket, in milliseconds, safe across threads
+    """
+
+    BUCKETS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000] # Default upper bounds
+
+    buckets = None # Upper bounds of each bucket
+    counts = None  # How many fell in each bucket, the last for above them all
+    count = None   # How many in all
+    sum = None     # Total milliseconds
+
+    def __init__(self, buckets=None):
+
+        self.buckets = list(buckets or self.BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+        self._lock = threading.Lock()
+
+    def observe(self, duration):
+        """
+        Counts a latency
+        """
+
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, duration)] += 1
+            self.count += 1
+            self.sum += duration
+
+    def to_dict(self):
+        """
+        Counts as cumulative buckets, for scraping
+        """
+
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "buckets": {
+                    str(bound): count
+                    for bound, count in zip(self.buckets + ["+Inf"], itertools.accumulate(self.counts))
+                }
+            }
+
+class Timer:
+    """
+    Times the phases of a request, keeping latencies by resource and method
+    """
+
+    HOOKS = []      # Callables sent the resource, method, total and phases of every request
+    HISTOGRAMS = {} # Latencies by resource and method
+
+    _lock = threading.Lock()
+
+    start = None  # When the request started being timed
+    phases = None # Milliseconds by phase, in the order they happened
+
+    def __init__(self):
+
+        self.start = time.perf_counter()
+        self.phases = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Times a phase, adding to it if it's happened already
+        """
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, duration):
+        """
+        Adds milliseconds to a phase
+        """
+
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def elapsed(self):
+        """
+        Milliseconds since the request started being timed
+        """
+
+        return (time.perf_counter() - self.start) * 1000
+
+    def header(self, total):
+        """
+        Server-Timing header for all the phases and the total
+        """
+
+        return ", ".join(
+            [f"{name};dur={duration:.3f}" for name, duration in self.phases.items()] + [f"total;dur={total:.3f}"]
+        )
+
+    def record(self, resource, method):
+        """
+        Keeps the total for resource and method, and sends everything to the hooks
+        """
+
+        total = self.elapsed()
+
+        self.histogram(resource, method).observe(total)
+
+        for hook in self.HOOKS:
+            try:
+                hook(resource, method, total, dict(self.phases))
+            except Exception: # pylint: disable=broad-except
+                logger.exception("timing hook %s failed", hook)
+
+        return total
+
+    @classmethod
+    def current(cls):
+        """
+        The timer for the current request, started the first time, kept with the request
+        as flask.g is shared by every request in an app context
+        """
+
+        environ = flask.request.environ
+
+        if "relations_restful.timer" not in environ:
+            environ["relations_restful.timer"] = cls()
+
+        return environ["relations_restful.timer"]
+
+    @classmethod
+    def phased(cls, name):
+        """
+        Times a phase of the current request if something's timing it already, as only resources
+        know whether they're timed, else does nothing
+        """
+
+        timer = flask.request.environ.get("relations_restful.timer")
+
+        if timer is None:
+            return contextlib.nullcontext()
+
+        return timer.phase(name)
+
+    @classmethod
+    def histogram(cls, resource, method):
+        """
+        The latencies for a resource and method, created the first time
+        """
+
+        with cls._lock:
+            return cls.HISTOGRAMS.setdefault((resource, method), Histogram())
+
+    @classmethod
+    def stats(cls):
+        """
+        All the latencies, by resource and method
+        """
+
+        with cls._lock:
+            histograms = sorted(cls.HISTOGRAMS.items())
+
+        return [
+            {"resource": resource, "method": method, **histogram.to_dict()}
+            for (resource, method), histogram in histograms
+        ]
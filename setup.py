@@ -7,11 +7,21 @@ setup(
     package_dir = {'': 'lib'},
     py_modules = [
         'relations_restful',
-        'relations_restful.resource'
+        'relations_restful.cache',
+        'relations_restful.compression',
+        'relations_restful.queries',
+        'relations_restful.resource',
+        'relations_restful.serializer',
+        'relations_restful.timing'
     ],
     install_requires=[
         'requests==2.25.1',
         'flask==2.1.1',
         'flask_restful==0.3.9'
-    ]
+    ],
+    extras_require={
+        'async': ['asgiref==3.5.0'],
+        'fast': ['orjson==3.8.3'],
+        'binary': ['msgpack==1.0.4']
+    }
 )
@@ -3,6 +3,7 @@ import unittest.mock
 import relations.unittest
 
 import sys
+import msgpack
 import flask
 import flask_restful
 
@@ -49,6 +50,10 @@ class TestRestful(relations.unittest.TestCase):
         self.assertEqual(common[0].MODEL, PeanutButter)
         self.assertTrue(issubclass(common[0], relations_restful.Resource))
 
+        common = relations_restful.ensure(sys.modules[__name__], relations.models(sys.modules[__name__], ResourceModel), relations_restful.AsyncResource)
+
+        self.assertTrue(issubclass(common[0], relations_restful.AsyncResource))
+
     def test_attach(self):
 
         relations.unittest.MockSource("TestRestful")
@@ -105,6 +110,10 @@ class TestRestful(relations.unittest.TestCase):
             "name": "chunky"
         })
 
+        response = api.get("/timing")
+
+        self.assertIn(("peanut_butter", "get"), [(timing["resource"], timing["method"]) for timing in response.json["timings"]])
+
         response = api.get(f"/peanut_butter/0")
 
         self.assertStatusModel(response, 404, "message", 'peanut_butter: none retrieved')
@@ -117,3 +126,49 @@ class TestRestful(relations.unittest.TestCase):
 
         self.assertIsNone(response.json)
         self.assertEqual(response.status_code, 404)
+
+        app = flask.Flask("async-restful-api")
+        restful = flask_restful.Api(app)
+
+        relations_restful.attach(restful, sys.modules[__name__], relations.models(sys.modules[__name__], ResourceModel), relations_restful.AsyncResource)
+
+        api = app.test_client()
+
+        response = api.post("/peanut_butter", json={"peanut_butter": {"name": "smooth"}})
+
+        self.assertStatusModel(response, 201, "peanut_butter", {
+            "name": "smooth"
+        })
+
+        self.assertIsInstance(restful.representations["application/json"].__self__, relations_restful.OrjsonSerializer)
+        self.assertIsInstance(restful.representations["application/msgpack"].__self__, relations_restful.MsgpackSerializer)
+
+        response = api.get("/model", headers={"Accept": "application/msgpack"})
+
+        self.assertEqual(response.content_type, "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.data)["models"][0]["title"], "Jelly")
+
+        app = flask.Flask("json-restful-api")
+        restful = flask_restful.Api(app)
+
+        relations_restful.attach(restful, sys.modules[__name__], [], serializer=relations_restful.JSONSerializer())
+
+        self.assertIsInstance(restful.representations["application/json"].__self__, relations_restful.JSONSerializer)
+        self.assertStatusValue(app.test_client().get("/model"), 200, "models", [
+            {
+                "id": None,
+                "title": "Jelly",
+                "singular": "jelly",
+                "plural": "jellies",
+                "titles": ["name"],
+                "list": ["name"]
+            },
+            {
+                "id": "id",
+                "title": "Time",
+                "singular": "time",
+                "plural": "times",
+                "titles": ["name"],
+                "list": ["id", "name"]
+            }
+        ])
@@ -0,0 +1,155 @@
+import unittest
+import unittest.mock
+
+import relations_restful
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.cache = relations_restful.Cache()
+
+    def tearDown(self):
+
+        relations_restful.Cache.CACHES.discard(self.cache)
+
+    def test___init__(self):
+
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.misses, 0)
+        self.assertIn(self.cache, relations_restful.Cache.CACHES)
+
+    def test_many(self):
+
+        self.assertRaisesRegex(NotImplementedError, "need to implement 'many' in Cache", self.cache.many, "people", [1])
+
+    def test_update(self):
+
+        self.assertRaisesRegex(NotImplementedError, "need to implement 'update' in Cache", self.cache.update, "people", {1: "a"})
+
+    def test_delete(self):
+
+        self.assertRaisesRegex(NotImplementedError, "need to implement 'delete' in Cache", self.cache.delete, "people")
+
+    def test_stats(self):
+
+        self.assertEqual(self.cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_invalidate(self):
+
+        relations_restful.Cache.CACHES.discard(self.cache)
+
+        one = relations_restful.MemoryCache()
+        two = relations_restful.MemoryCache()
+
+        one.update("people", {1: "a", 2: "b"})
+        two.update("people", {1: "a"})
+        two.update("things", {1: "c"})
+
+        relations_restful.Cache.invalidate("people", [1])
+
+        self.assertEqual(one.many("people", [1, 2]), {2: "b"})
+        self.assertEqual(two.many("people", [1]), {})
+
+        relations_restful.Cache.invalidate("people")
+
+        self.assertEqual(one.many("people", [1, 2]), {})
+        self.assertEqual(two.many("things", [1]), {1: "c"})
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test___init__(self):
+
+        cache = relations_restful.MemoryCache(ttl=5, size=10)
+
+        self.assertEqual(cache.ttl, 5)
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(len(cache), 0)
+
+    @unittest.mock.patch("time.monotonic")
+    def test_many(self, mock_time):
+
+        mock_time.return_value = 100
+
+        cache = relations_restful.MemoryCache(ttl=5)
+        cache.update("people", {1: "a", 2: "b"})
+
+        self.assertEqual(cache.many("people", [1, 3]), {1: "a"})
+        self.assertEqual(cache.many("things", [1]), {})
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2, "size": 2, "bytes": 0})
+
+        mock_time.return_value = 105
+
+        self.assertEqual(cache.many("people", [1, 2]), {})
+        self.assertEqual(len(cache), 0)
+
+        cache = relations_restful.MemoryCache(ttl=None)
+        cache.update("people", {1: "a"})
+
+        mock_time.return_value = 1000
+
+        self.assertEqual(cache.many("people", [1]), {1: "a"})
+
+    def test_update(self):
+
+        cache = relations_restful.MemoryCache(size=2)
+
+        cache.update("people", {1: "a", 2: "b"})
+        cache.many("people", [1])
+        cache.update("people", {3: "c"})
+
+        self.assertEqual(cache.many("people", [1, 2, 3]), {1: "a", 3: "c"})
+
+        cache.update("people", {1: "d"})
+
+        self.assertEqual(cache.many("people", [1]), {1: "d"})
+        self.assertEqual(len(cache), 2)
+
+        cache = relations_restful.MemoryCache(bytes=5)
+
+        cache.update("people", {1: "ab", 2: "cd"})
+        cache.many("people", [1])
+        cache.update("people", {3: "ef"})
+
+        self.assertEqual(cache.many("people", [1, 2, 3]), {1: "ab", 3: "ef"})
+        self.assertEqual(cache.stats()["bytes"], 4)
+
+        cache.update("people", {4: "toolong"})
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_weigh(self):
+
+        self.assertEqual(relations_restful.MemoryCache.weigh("abc"), 3)
+        self.assertEqual(relations_restful.MemoryCache.weigh(b"ab"), 2)
+        self.assertEqual(relations_restful.MemoryCache.weigh({"a": [1]}), 10)
+
+    def test_delete(self):
+
+        cache = relations_restful.MemoryCache()
+
+        cache.update("people", {1: "a", 2: "b"})
+        cache.update("things", {1: "c"})
+
+        cache.delete("people", [1, 3])
+        self.assertEqual(cache.many("people", [1, 2]), {2: "b"})
+
+        cache.delete("people")
+        self.assertEqual(cache.many("people", [2]), {})
+        self.assertEqual(cache.many("things", [1]), {1: "c"})
+
+    def test_stats(self):
+
+        cache = relations_restful.MemoryCache()
+        cache.update("people", {1: "a"})
+        cache.many("people", [1, 2])
+
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1, "bytes": 0})
+
+        cache = relations_restful.MemoryCache(bytes=100)
+        cache.update("people", {1: "abc"})
+
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "size": 1, "bytes": 3})
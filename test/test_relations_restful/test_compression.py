@@ -0,0 +1,108 @@
+import unittest
+import unittest.mock
+
+import gzip
+import zlib
+
+import flask
+
+import relations_restful
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+
+        self.app = flask.Flask("compression-api")
+
+        self.compression = relations_restful.Compression(minimum=10, level=1)
+
+    def test___init__(self):
+
+        compression = relations_restful.Compression()
+
+        self.assertEqual(compression.minimum, 1024)
+        self.assertEqual(compression.level, 6)
+
+        self.assertEqual(self.compression.minimum, 10)
+        self.assertEqual(self.compression.level, 1)
+
+    def test_encoding(self):
+
+        with self.app.test_request_context("/"):
+            self.assertIsNone(self.compression.encoding())
+
+        with self.app.test_request_context("/", headers={"Accept-Encoding": "deflate, gzip"}):
+            self.assertEqual(self.compression.encoding(), "gzip")
+
+        with self.app.test_request_context("/", headers={"Accept-Encoding": "gzip;q=0.5, deflate"}):
+            self.assertEqual(self.compression.encoding(), "deflate")
+
+        with self.app.test_request_context("/", headers={"Accept-Encoding": "gzip;q=0, br"}):
+            self.assertIsNone(self.compression.encoding())
+
+    def test_compressor(self):
+
+        compressor = self.compression.compressor("gzip")
+        self.assertEqual(gzip.decompress(compressor.compress(b"yep") + compressor.flush()), b"yep")
+
+        compressor = self.compression.compressor("deflate")
+        self.assertEqual(zlib.decompress(compressor.compress(b"yep") + compressor.flush()), b"yep")
+
+    def test_stream(self):
+
+        def chunks():
+            yield "ya"
+            yield b"sure"
+            yield ""
+
+        self.assertEqual(gzip.decompress(b"".join(self.compression.stream(chunks(), "gzip"))), b"yasure")
+
+        closing = unittest.mock.MagicMock()
+        closing.__iter__.return_value = iter(["ya"])
+
+        list(self.compression.stream(closing, "deflate"))
+
+        closing.close.assert_called_once_with()
+
+    def test_compress(self):
+
+        with self.app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+
+            response = flask.Response("yep" * 10)
+            response.set_etag("abc")
+
+            self.assertIs(self.compression.compress(response), response)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(response.headers["ETag"], '"abc-gzip"')
+            self.assertEqual(int(response.headers["Content-Length"]), len(response.get_data()))
+            self.assertEqual(gzip.decompress(response.get_data()), b"yep" * 10)
+
+            response = flask.Response("yep")
+            self.compression.compress(response)
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(response.get_data(), b"yep")
+
+            response = flask.Response(status=304)
+            self.compression.compress(response)
+            self.assertNotIn("Vary", response.headers)
+
+            response = flask.Response("yep" * 10, headers={"Content-Encoding": "br"})
+            self.compression.compress(response)
+            self.assertEqual(response.headers["Content-Encoding"], "br")
+            self.assertEqual(response.get_data(), b"yep" * 10)
+
+            response = flask.Response(iter(["y", "e", "p"]), headers={"Content-Length": "3"})
+            self.compression.compress(response)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertNotIn("Content-Length", response.headers)
+            self.assertEqual(gzip.decompress(b"".join(response.response)), b"yep")
+
+        with self.app.test_request_context("/"):
+
+            response = flask.Response("yep" * 10)
+            self.compression.compress(response)
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
@@ -0,0 +1,120 @@
+import unittest
+import unittest.mock
+
+import contextvars
+
+import relations
+import relations.unittest
+
+import relations_restful
+
+
+class Thing(relations.Model):
+    SOURCE = "TestRestfulQueries"
+    id = int
+    name = str
+
+
+class TestQueries(unittest.TestCase):
+
+    def setUp(self):
+
+        self.source = relations.unittest.MockSource("TestRestfulQueries")
+
+    def test___init__(self):
+
+        queries = relations_restful.Queries()
+
+        self.assertEqual(queries.counts, {})
+        self.assertEqual(len(queries), 0)
+
+    def test___len__(self):
+
+        queries = relations_restful.Queries()
+        queries.counts = {"retrieve": 2, "titles": 1}
+
+        self.assertEqual(len(queries), 3)
+
+    def test_add(self):
+
+        queries = relations_restful.Queries()
+
+        queries.add("retrieve")
+        queries.add("titles")
+        queries.add("retrieve")
+
+        self.assertEqual(queries.counts, {"retrieve": 2, "titles": 1})
+
+    def test_counted(self):
+
+        call = unittest.mock.MagicMock(return_value="yep")
+
+        wrap = relations_restful.Queries.counted("retrieve", call)
+
+        self.assertTrue(wrap.relations_restful_counted)
+        self.assertEqual(wrap(1, a=2), "yep")
+        call.assert_called_once_with(1, a=2)
+
+        queries = relations_restful.Queries()
+        token = relations_restful.Queries.CURRENT.set(queries)
+
+        try:
+            wrap()
+            contextvars.copy_context().run(wrap)
+        finally:
+            relations_restful.Queries.CURRENT.reset(token)
+
+        wrap()
+
+        self.assertEqual(queries.counts, {"retrieve": 2})
+
+        queries = relations_restful.Queries()
+        token = relations_restful.Queries.CURRENT.set(queries)
+
+        outer = relations_restful.Queries.counted("titles", lambda: wrap())
+
+        try:
+            outer()
+        finally:
+            relations_restful.Queries.CURRENT.reset(token)
+
+        self.assertEqual(queries.counts, {"titles": 1})
+        self.assertFalse(relations_restful.Queries.INSIDE.get())
+
+    def test_watch(self):
+
+        relations_restful.Queries.watch(self.source)
+        retrieve = self.source.retrieve
+
+        relations_restful.Queries.watch(self.source)
+
+        self.assertIs(self.source.retrieve, retrieve)
+
+        for method in relations_restful.Queries.METHODS:
+            self.assertTrue(getattr(self.source, method).relations_restful_counted)
+
+    def test_start(self):
+
+        queries, token = relations_restful.Queries.start()
+
+        try:
+            Thing("ya").create()
+            Thing.many().count()
+            Thing.one(id=1).retrieve()
+            Thing.many().titles()
+        finally:
+            relations_restful.Queries.stop(token)
+
+        Thing.many().count()
+
+        self.assertEqual(queries.counts, {"create": 1, "count": 1, "retrieve": 1, "titles": 1})
+
+    def test_stop(self):
+
+        queries, token = relations_restful.Queries.start()
+
+        self.assertIs(relations_restful.Queries.CURRENT.get(), queries)
+
+        relations_restful.Queries.stop(token)
+
+        self.assertIsNone(relations_restful.Queries.CURRENT.get())
@@ -1,5 +1,17 @@
 import unittest
 import unittest.mock
+
+import gzip
+import base64
+import json
+import zlib
+import queue
+import msgpack
+import asyncio
+import time
+import threading
+import functools
+import concurrent.futures
 import relations.unittest
 
 import flask
@@ -21,6 +33,10 @@ class Simple(ResourceModel):
     name = str
     CHUNK = 2
 
+class Keyed(ResourceModel):
+    id = int, {"auto": False}
+    name = str
+
 class Plain(ResourceModel):
     ID = None
     simple_id = int
@@ -28,6 +44,16 @@ class Plain(ResourceModel):
 
 relations.OneToMany(Simple, Plain)
 
+class Double(ResourceModel):
+    id = int
+    simple_id = int
+    other_id = int
+    plain_id = int
+    name = str
+
+relations.OneToMany(Simple, Double)
+relations.OneToMany(Simple, Double, parent_child="others", child_parent="other", child_field="other_id")
+
 class Meta(ResourceModel):
     id = int
     name = str
@@ -72,6 +98,12 @@ class SimpleResource(relations_restful.Resource):
 class PlainResource(relations_restful.Resource):
     MODEL = Plain
 
+class KeyedResource(relations_restful.Resource):
+    MODEL = Keyed
+
+class DoubleResource(relations_restful.Resource):
+    MODEL = Double
+
 class MetaResource(relations_restful.Resource):
     MODEL = Meta
 
@@ -89,6 +121,7 @@ class TestRestful(relations.unittest.TestCase):
 
         restful.add_resource(SimpleResource, *SimpleResource.thy().endpoints())
         restful.add_resource(PlainResource, *PlainResource.thy().endpoints())
+        restful.add_resource(KeyedResource, *KeyedResource.thy().endpoints())
         restful.add_resource(MetaResource, *MetaResource.thy().endpoints())
         restful.add_resource(NetResource, *NetResource.thy().endpoints())
 
@@ -97,8 +130,47 @@ class TestRestful(relations.unittest.TestCase):
 
 class TestExceptions(TestRestful):
 
+    @unittest.mock.patch("relations_restful.resource.logger")
+    def test_drain(self, mock_logger):
+
+        exception = Exception("whoops")
+
+        relations_restful.resource.ERRORS.put(("GET", "/ugly", exception))
+
+        with unittest.mock.patch.object(relations_restful.resource.ERRORS, "get", side_effect=[
+            relations_restful.resource.ERRORS.get(), SystemExit
+        ]):
+            self.assertRaises(SystemExit, relations_restful.resource.drain)
+
+        mock_logger.error.assert_called_once_with("%s %s failed", "GET", "/ugly", exc_info=(Exception, exception, None))
+
+    @unittest.mock.patch("relations_restful.resource.logger")
+    def test_log(self, mock_logger):
+
+        with self.app.test_request_context("/ugly"):
+
+            try:
+                raise Exception("whoops")
+            except Exception as exception:
+                relations_restful.resource.log(exception)
+
+        relations_restful.resource.ERRORS.join()
+
+        self.assertEqual(mock_logger.error.call_args.args, ("%s %s failed", "GET", "/ugly"))
+        self.assertEqual(str(mock_logger.error.call_args.kwargs["exc_info"][1]), "whoops")
+
+        with unittest.mock.patch.object(relations_restful.resource.ERRORS, "put_nowait", side_effect=queue.Full):
+            with self.app.test_request_context("/ugly"):
+                relations_restful.resource.log(Exception("dropped"))
+
+    def test_code(self):
+
+        self.assertEqual(relations_restful.resource.code("Not Found"), "not_found")
+        self.assertEqual(relations_restful.resource.code("I'm a teapot"), "im_a_teapot")
+
+    @unittest.mock.patch("relations_restful.resource.log")
     @unittest.mock.patch("traceback.format_exc")
-    def test_exceptions(self, mock_traceback):
+    def test_exceptions(self, mock_traceback, mock_log):
 
         @relations_restful.exceptions
         def good():
@@ -115,6 +187,16 @@ class TestExceptions(TestRestful):
         self.app.add_url_rule('/bad', 'bad', bad)
 
         self.assertStatusValue(self.api.get("/bad"), 400, "message", "nope")
+        self.assertStatusValue(self.api.get("/bad"), 400, "code", "bad_request")
+
+        @relations_restful.exceptions
+        def gone():
+            raise werkzeug.exceptions.PreconditionFailed("changed")
+
+        self.app.add_url_rule('/gone', 'gone', gone)
+
+        self.assertStatusValue(self.api.get("/gone"), 412, "message", "changed")
+        self.assertStatusValue(self.api.get("/gone"), 412, "code", "precondition_failed")
 
         @relations_restful.exceptions
         def ugly():
@@ -124,10 +206,34 @@ class TestExceptions(TestRestful):
 
         self.app.add_url_rule('/ugly', 'ugly', ugly)
 
+        self.app.debug = True
+
         response = self.api.get("/ugly")
 
         self.assertStatusValue(response, 500, "message", "whoops")
+        self.assertStatusValue(response, 500, "code", "internal_error")
         self.assertStatusValue(response, 500, "traceback", "adaisy")
+        mock_log.assert_not_called()
+
+        self.app.debug = False
+
+        response = self.api.get("/ugly")
+
+        self.assertStatusValue(response, 500, "message", "whoops")
+        self.assertNotIn("traceback", response.json)
+        self.assertEqual(str(mock_log.call_args.args[0]), "whoops")
+
+        self.app.config["RELATIONS_RESTFUL_TRACEBACKS"] = True
+
+        self.assertStatusValue(self.api.get("/ugly"), 500, "traceback", "adaisy")
+
+        self.app.config["RELATIONS_RESTFUL_TRACEBACKS"] = False
+        self.app.debug = True
+
+        self.assertNotIn("traceback", self.api.get("/ugly").json)
+        self.assertEqual(mock_log.call_count, 2)
+
+        self.app.debug = False
 
         @relations_restful.exceptions
         def missing():
@@ -136,6 +242,7 @@ class TestExceptions(TestRestful):
         self.app.add_url_rule('/missing', 'missing', missing)
 
         self.assertStatusValue(self.api.get("/missing"), 404, "message", "simple: none retrieved")
+        self.assertStatusValue(self.api.get("/missing"), 404, "code", "not_found")
 
         @relations_restful.exceptions
         def broken():
@@ -144,6 +251,197 @@ class TestExceptions(TestRestful):
         self.app.add_url_rule('/broken', 'broken', broken)
 
         self.assertStatusValue(self.api.get("/broken"), 500, "message", "simple: broken query")
+        self.assertStatusValue(self.api.get("/broken"), 500, "code", "model_error")
+
+
+class TestResourceSpec(TestRestful):
+
+    def test___init__(self):
+
+        @relations_restful.exceptions
+        def spec():
+            return {"spec": relations_restful.ResourceSpec().__dict__}
+
+        self.app.add_url_rule('/spec', 'spec', spec)
+
+        response = self.api.get("/spec")
+        self.assertStatusValue(response, 200, "spec", {
+            "body": {},
+            "args": {},
+            "filter": {},
+            "sort": [],
+            "limit": {},
+            "count": False,
+            "total": False,
+            "stream": None,
+            "cursor": None,
+            "fields": None,
+            "formats": True,
+            "titles": {},
+            "bulk": False,
+            "layout": None,
+            "export": None,
+            "titled": False,
+            "names": []
+        })
+
+        response = self.api.get("/spec?a=1&sort=b,-c&limit=2&limit__start=1&count=no&stream=yes&cursor=d&fields=g,h&formats=no&layout=rows&export=csv&titles=yes", json={
+            "filter": {"a": 2, "e": 3},
+            "sort": ["f"],
+            "limit": {"start": "4"},
+            "count": True
+        })
+        self.assertStatusValue(response, 200, "spec", {
+            "body": {"filter": {"a": 2, "e": 3}, "sort": ["f"], "limit": {"start": "4"}, "count": True},
+            "args": {"a": "1", "sort": "b,-c", "limit": "2", "limit__start": "1", "count": "no", "stream": "yes", "cursor": "d", "fields": "g,h", "formats": "no", "layout": "rows", "export": "csv", "titles": "yes"},
+            "filter": {"a": 2, "e": 3},
+            "sort": ["b", "-c", "f"],
+            "limit": {"limit": 2, "start": 4},
+            "count": True,
+            "total": False,
+            "stream": "yes",
+            "cursor": "d",
+            "fields": ["g", "h"],
+            "formats": False,
+            "titles": {},
+            "bulk": False,
+            "layout": "rows",
+            "export": "csv",
+            "titled": True,
+            "names": []
+        })
+
+        response = self.api.get("/spec?fields=a", json={"fields": ["b"]})
+        self.assertEqual(response.json["spec"]["fields"], ["b"])
+
+        response = self.api.get("/spec?limit=nope")
+        self.assertStatusValue(response, 400, "message", "limit values must be integers")
+
+        response = self.api.get("/spec", json={"limit": ["nope"]})
+        self.assertStatusValue(response, 400, "message", "limit values must be integers")
+
+        body = msgpack.packb({"filter": {"a": 1}, "count": True})
+
+        response = self.api.get("/spec", data=body, content_type="application/msgpack")
+        self.assertEqual(response.json["spec"]["body"], {"filter": {"a": 1}, "count": True})
+        self.assertEqual(response.json["spec"]["filter"], {"a": 1})
+        self.assertTrue(response.json["spec"]["count"])
+
+        response = self.api.get("/spec", data=b"\xc1", content_type="application/msgpack")
+        self.assertStatusValue(response, 400, "message", "invalid msgpack")
+
+        with unittest.mock.patch("relations_restful.serializer.msgpack", None):
+            response = self.api.get("/spec", data=body, content_type="application/msgpack")
+            self.assertStatusValue(response, 415, "message", "msgpack isn't installed")
+
+    def test_value(self):
+
+        @relations_restful.exceptions
+        def value():
+            spec = relations_restful.ResourceSpec()
+            return {"value": [spec.value("a"), spec.value("b", "c")]}
+
+        self.app.add_url_rule('/value', 'value', value)
+
+        self.assertStatusValue(self.api.get("/value"), 200, "value", [None, "c"])
+        self.assertStatusValue(self.api.get("/value?a=1&b=2"), 200, "value", ["1", "2"])
+        self.assertStatusValue(self.api.get("/value?a=1&b=2", json={"a": 3}), 200, "value", [3, "2"])
+
+    def test_model_fields(self):
+
+        @relations_restful.exceptions
+        def model_fields():
+            return {"model_fields": relations_restful.ResourceSpec.model_fields()}
+
+        self.app.add_url_rule('/model_fields', 'model_fields', model_fields)
+
+        self.assertStatusValue(self.api.get("/model_fields"), 200, "model_fields", [])
+
+        with self.app.test_request_context("/simple"):
+            self.assertEqual(relations_restful.ResourceSpec.model_fields(), ["id", "name"])
+
+    def test_reserved(self):
+
+        class Tally(ResourceModel):
+            id = int
+            total = int
+
+        class TallyResource(relations_restful.Resource):
+            MODEL = Tally
+
+        flask_restful.Api(self.app).add_resource(TallyResource, *TallyResource.thy().endpoints())
+
+        with self.app.test_request_context("/tally?total=1&count=yes&limit__per_page=2&sort=-id"):
+            spec = relations_restful.ResourceSpec()
+            self.assertTrue(spec.reserved("count"))
+            self.assertTrue(spec.reserved("limit__per_page"))
+            self.assertFalse(spec.reserved("total"))
+            self.assertFalse(spec.reserved("a"))
+            self.assertEqual(spec.filter, {"total": "1"})
+            self.assertFalse(spec.total)
+
+        Tally(total=1).create()
+        Tally(total=2).create()
+
+        # As an argument, a field is a filter, the setting only in the body
+
+        response = self.api.get("/tally?total=1")
+        self.assertStatusValue(response, 200, "tallys", [{"id": 1, "total": 1}])
+        self.assertNotIn("total", response.json)
+
+        response = self.api.get("/tally", json={"total": True})
+        self.assertStatusValue(response, 200, "total", 2)
+
+    def test_flag(self):
+
+        self.assertTrue(relations_restful.ResourceSpec.flag(True))
+        self.assertEqual(relations_restful.ResourceSpec.flag(0), 0)
+        self.assertTrue(relations_restful.ResourceSpec.flag("yes"))
+        self.assertFalse(relations_restful.ResourceSpec.flag("False"))
+        self.assertFalse(relations_restful.ResourceSpec.flag("0"))
+        self.assertFalse(relations_restful.ResourceSpec.flag("no"))
+
+    def test_key(self):
+
+        @relations_restful.exceptions
+        def key():
+            return {"key": relations_restful.ResourceSpec().key(1)}
+
+        self.app.add_url_rule('/key', 'key', key)
+
+        self.assertStatusValue(self.api.get("/key"), 200, "key", '[1, {}, [], {}, false, false, null, null, true, null]')
+
+        self.assertStatusValue(
+            self.api.get("/key?b=2&a=1&sort=c&limit=3&total=yes&cursor=d&fields=e&formats=false&layout=rows"),
+            200, "key", '[1, {"a": "1", "b": "2"}, ["c"], {"limit": 3}, false, true, "d", ["e"], false, "rows"]'
+        )
+
+    @unittest.mock.patch("relations_restful.resource.logger")
+    def test_current(self, mock_logger):
+
+        @relations_restful.exceptions
+        def current():
+            return {"current": relations_restful.ResourceSpec.current() is relations_restful.ResourceSpec.current()}
+
+        self.app.add_url_rule('/current', 'current', current)
+
+        self.assertStatusValue(self.api.get("/current"), 200, "current", True)
+        self.assertEqual(mock_logger.debug.call_count, 1)
+
+        response = self.api.get("/simple?sort=-id&limit=1")
+        self.assertStatusModels(response, 200, "simples", [])
+        self.assertEqual(mock_logger.debug.call_count, 2)
+
+        # Requests sharing an app context still get their own spec
+
+        Simple("a").create()
+        Simple("b").create()
+
+        with self.app.app_context():
+
+            self.assertStatusModels(self.api.get("/simple?name=a"), 200, "simples", [{"name": "a"}])
+            self.assertStatusModels(self.api.get("/simple?name=b"), 200, "simples", [{"name": "b"}])
+            self.assertStatusModel(self.api.post("/simple", json={"simple": {"name": "c"}}), 201, "simple", {"name": "c"})
 
 
 class Whoops(relations.Model):
@@ -227,6 +525,8 @@ class TestResourceIdentity(TestRestful):
             }
         ])
         self.assertEqual(resource.LIST, ['id', 'name'])
+        self.assertEqual(resource._formats, {"ip": {"format": [None]}})
+        self.assertEqual(resource.UNIQUE, ["id"])
 
         Init.SINGULAR = "inity"
         Init.TITLES = ["name", "status"]
@@ -337,9 +637,71 @@ class TestResourceIdentity(TestRestful):
         self.assertEqual(resource.PLURAL, "initiease")
         self.assertEqual(resource.LIST, ['name'])
 
+        InitResource.UNIQUE = "name"
+        self.assertEqual(InitResource.thy().UNIQUE, ["name"])
+
+        InitResource.UNIQUE = ["nope"]
+        self.assertRaisesRegex(relations_restful.ResourceError, "cannot find field nope from unique", InitResource.thy)
+
+        InitResource.UNIQUE = None
         InitResource.LIST = ["nope"]
         self.assertRaisesRegex(relations_restful.ResourceError, "cannot find field nope from list", InitResource.thy)
 
+        self.assertEqual(PlainResource.thy().UNIQUE, [])
+
+        self.assertIsInstance(PlainResource.thy().COMPRESSION, relations_restful.Compression)
+
+        compression = relations_restful.Compression(level=9)
+        InitResource.LIST = None
+        InitResource.COMPRESSION = compression
+        self.assertIs(InitResource.thy().COMPRESSION, compression)
+
+        InitResource.COMPRESSION = False
+        self.assertFalse(InitResource.thy().COMPRESSION)
+
+    @unittest.mock.patch.object(relations_restful.ResourceIdentity, "thy", wraps=relations_restful.ResourceIdentity.thy)
+    def test_identity(self, mock_thy):
+
+        class Ident(ResourceModel):
+            id = int
+            name = str
+
+        class IdentResource(relations_restful.ResourceIdentity):
+            MODEL = Ident
+
+        identity = IdentResource.identity()
+        self.assertIsInstance(identity, IdentResource)
+        self.assertEqual(identity.SINGULAR, "ident")
+        self.assertEqual(identity.LIST, ["id", "name"])
+        self.assertEqual(mock_thy.call_count, 1)
+
+        self.assertIs(IdentResource.identity(), identity)
+        self.assertEqual(mock_thy.call_count, 1)
+
+        class SubIdentResource(IdentResource):
+            PLURAL = "identities"
+
+        self.assertEqual(SubIdentResource.identity().PLURAL, "identities")
+        self.assertEqual(IdentResource.identity().PLURAL, "idents")
+
+    def test_forget(self):
+
+        class Forget(ResourceModel):
+            id = int
+            name = str
+
+        class ForgetResource(relations_restful.ResourceIdentity):
+            MODEL = Forget
+
+        identity = ForgetResource.identity()
+        ForgetResource.LIST = ["name"]
+        self.assertIs(ForgetResource.identity(), identity)
+        self.assertEqual(ForgetResource.identity().LIST, ["id", "name"])
+
+        ForgetResource.forget()
+        self.assertIsNot(ForgetResource.identity(), identity)
+        self.assertEqual(ForgetResource.identity().LIST, ["name"])
+
     def test_endpoints(self):
 
         self.assertEqual(SimpleResource.thy().endpoints(), ["/simple", "/simple/<id>"])
@@ -358,6 +720,10 @@ class TestResource(TestRestful):
         class InitResource(relations_restful.Resource):
             MODEL = Init
 
+        resource = InitResource()
+        resource._fields[3]["default"]["changed"] = True
+        self.assertIs(resource._fields[0], InitResource()._fields[0])
+
         resource = InitResource()
         self.assertEqual(resource.SINGULAR, "init")
         self.assertEqual(resource.PLURAL, "inits")
@@ -385,6 +751,203 @@ class TestResource(TestRestful):
             }
         ])
 
+    def test_timed(self):
+
+        with relations_restful.Resource.timed("query"):
+            pass
+
+        @relations_restful.exceptions
+        def timed():
+            with relations_restful.Resource.timed("query"):
+                pass
+            return {"timed": list(relations_restful.Timer.current().phases)}
+
+        self.app.add_url_rule('/timed', 'timed', timed)
+
+        self.assertStatusValue(self.api.get("/timed"), 200, "timed", ["query"])
+
+        class UntimedResource(relations_restful.Resource):
+            MODEL = Simple
+            TIMING = False
+
+        with self.app.test_request_context("/"):
+
+            with UntimedResource.timed("query"):
+                pass
+
+            self.assertNotIn("relations_restful.timer", flask.request.environ)
+
+    def test_one(self):
+
+        simple = Simple("ya").create()
+
+        @relations_restful.exceptions
+        def one():
+            return {"one": SimpleResource().one(flask.request.args["id"]).export()}
+
+        self.app.add_url_rule('/one', 'one', one)
+
+        self.assertStatusValue(self.api.get(f"/one?id={simple.id}"), 200, "one", {"id": simple.id, "name": "ya"})
+        self.assertStatusValue(self.api.get("/one?id=0"), 404, "message", "simple: none retrieved")
+        self.assertStatusValue(self.api.get("/one?id=0"), 404, "code", "not_found")
+
+        with self.app.test_request_context():
+            self.assertEqual(SimpleResource().one(criteria={"name": "ya"}).id, simple.id)
+            self.assertRaisesRegex(werkzeug.exceptions.NotFound, "simple: none retrieved", SimpleResource().one, criteria={"name": "nope"})
+
+    def test_dispatch_request(self):
+
+        relations_restful.Timer.HISTOGRAMS.clear()
+
+        hook = unittest.mock.MagicMock()
+        relations_restful.Timer.HOOKS.append(hook)
+
+        Simple("ya").create().plain.add("sure").create()
+
+        self.app.config["RELATIONS_RESTFUL_QUERY_COUNT"] = True
+
+        try:
+
+            response = self.api.get("/simple")
+            phases = [phase.split(";")[0] for phase in response.headers["Server-Timing"].split(", ")]
+            self.assertEqual(phases, ["identity", "spec", "query", "export", "formats", "serialize", "compress", "total"])
+            self.assertEqual(response.headers["X-Query-Count"], "1")
+
+            response = self.api.get("/plain")
+            self.assertEqual(response.headers["X-Query-Count"], "2")
+
+            response = self.api.get("/simple?count=yes")
+            phases = [phase.split(";")[0] for phase in response.headers["Server-Timing"].split(", ")]
+            self.assertEqual(phases, ["identity", "spec", "count", "serialize", "compress", "total"])
+
+            response = self.api.get("/simple/1")
+            phases = [phase.split(";")[0] for phase in response.headers["Server-Timing"].split(", ")]
+            self.assertEqual(phases, ["identity", "spec", "query", "export", "formats", "serialize", "compress", "total"])
+
+            self.api.post("/plain", json={"plain": {"name": "whatevs"}})
+
+            self.assertEqual([call.args[:2] for call in hook.call_args_list], [
+                ("simple", "get"),
+                ("plain", "get"),
+                ("simple", "get"),
+                ("simple", "get"),
+                ("plain", "post")
+            ])
+            self.assertEqual(relations_restful.Timer.HISTOGRAMS[("simple", "get")].count, 3)
+
+            class UntimedResource(relations_restful.Resource):
+                MODEL = Simple
+                TIMING = False
+
+            app = flask.Flask("untimed-api")
+            flask_restful.Api(app).add_resource(UntimedResource, "/untimed")
+
+            with unittest.mock.patch.object(relations_restful.Timer, "__init__", return_value=None) as mock_timer:
+                response = app.test_client().get("/untimed")
+                mock_timer.assert_not_called()
+
+            self.assertStatusValue(response, 200, "simples", [{"id": 1, "name": "ya"}])
+            self.assertNotIn("Server-Timing", response.headers)
+            self.assertNotIn("X-Query-Count", response.headers)
+
+            Simple([{"name": f"{index} {'x' * 600}"} for index in range(10)]).create()
+
+            response = self.api.get("/simple", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(json.loads(gzip.decompress(response.data))["simples"][0]["name"], f"0 {'x' * 600}")
+
+            response = self.api.get("/simple?stream=ndjson", headers={"Accept-Encoding": "deflate"})
+            self.assertEqual(response.headers["Content-Encoding"], "deflate")
+            self.assertEqual(len(zlib.decompress(response.data).strip().split(b"\n")), 2)
+
+            response = self.api.get("/simple/1", headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertStatusValue(response, 200, "simple", {"id": 1, "name": "ya"})
+
+            # Compressed ETags stay strong, and still match the record
+
+            big = Simple(f"{'x' * 1200}").create()
+
+            response = self.api.get(f"/simple/{big.id}", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            etag = response.headers["ETag"]
+            self.assertEqual(etag, f'"{SimpleResource.variant(SimpleResource().etag(Simple.one(id=big.id)), None, {})}-gzip"')
+
+            response = self.api.get(f"/simple/{big.id}", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers["ETag"], etag)
+
+            response = self.api.patch(f"/simple/{big.id}", json={"simple": {"name": "smaller"}}, headers={"If-Match": etag})
+            self.assertStatusValue(response, 202, "updated", 1)
+
+            class UncompressedResource(relations_restful.Resource):
+                MODEL = Simple
+                COMPRESSION = False
+
+            app = flask.Flask("uncompressed-api")
+            flask_restful.Api(app).add_resource(UncompressedResource, "/uncompressed")
+
+            response = app.test_client().get("/uncompressed", headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("Content-Encoding", response.headers)
+            self.assertEqual(len(response.json["simples"]), 2)
+
+        finally:
+
+            relations_restful.Timer.HOOKS.remove(hook)
+            relations_restful.Timer.HISTOGRAMS.clear()
+
+    def test_counting(self):
+
+        class BudgetResource(relations_restful.Resource):
+            MODEL = Simple
+            BUDGET = 1
+
+        with self.app.app_context():
+
+            self.assertFalse(SimpleResource.counting())
+            self.assertTrue(BudgetResource.counting())
+
+            self.app.debug = True
+            self.assertTrue(SimpleResource.counting())
+
+            self.app.config["RELATIONS_RESTFUL_QUERY_COUNT"] = False
+            self.assertFalse(SimpleResource.counting())
+            self.assertTrue(BudgetResource.counting())
+
+            self.app.debug = False
+            self.app.config["RELATIONS_RESTFUL_QUERY_COUNT"] = True
+            self.assertTrue(SimpleResource.counting())
+
+    @unittest.mock.patch("relations_restful.resource.logger")
+    def test_budget(self, mock_logger):
+
+        class BudgetResource(relations_restful.Resource):
+            MODEL = Plain
+            BUDGET = 1
+
+        Simple("ya").create().plain.add("sure").create()
+
+        app = flask.Flask("budget-api")
+        flask_restful.Api(app).add_resource(BudgetResource, "/budget")
+        api = app.test_client()
+
+        response = api.get("/budget?formats=no")
+        self.assertStatusValue(response, 200, "plains", [{"simple_id": 1, "name": "sure"}])
+        mock_logger.warning.assert_not_called()
+        self.assertEqual(response.headers["X-Query-Count"], "1")
+
+        response = api.get("/budget")
+        self.assertStatusValue(response, 200, "plains", [{"simple_id": 1, "name": "sure"}])
+        mock_logger.warning.assert_called_once_with("GET /budget made 2 queries, over 1: {'retrieve': 1, 'titles': 1}")
+
+        app.testing = True
+
+        self.assertRaisesRegex(
+            relations_restful.ResourceError, "BudgetResource: GET /budget made 2 queries, over 1",
+            api.get, "/budget"
+        )
+
     def test_json(self):
 
         @relations_restful.exceptions
@@ -485,6 +1048,182 @@ class TestResource(TestRestful):
         response = self.api.get("/count", json={"count": "no"})
         self.assertStatusValue(response, 200, "count", False)
 
+    def test_total(self):
+
+        @relations_restful.exceptions
+        def total():
+            return {"total": relations_restful.Resource.total()}
+
+        self.app.add_url_rule('/total', 'total', total)
+
+        response = self.api.get("/total")
+        self.assertStatusValue(response, 200, "total", False)
+
+        response = self.api.get("/total?total=yes")
+        self.assertStatusValue(response, 200, "total", True)
+
+        response = self.api.get("/total?total=yes", json={"total": "false"})
+        self.assertStatusValue(response, 200, "total", False)
+
+    def test_cursor(self):
+
+        @relations_restful.exceptions
+        def cursor():
+            return {"cursor": relations_restful.Resource.cursor()}
+
+        self.app.add_url_rule('/cursor', 'cursor', cursor)
+
+        response = self.api.get("/cursor")
+        self.assertStatusValue(response, 200, "cursor", None)
+
+        marker = SimpleResource().marker(["+id"], Simple("ya", id=3))
+
+        response = self.api.get(f"/cursor?cursor={marker}")
+        self.assertStatusValue(response, 200, "cursor", {"keys": ["+id"], "values": [3]})
+
+        response = self.api.get("/cursor?cursor=nope", json={"cursor": marker})
+        self.assertStatusValue(response, 200, "cursor", {"keys": ["+id"], "values": [3]})
+
+        response = self.api.get("/cursor?cursor=nope")
+        self.assertStatusValue(response, 400, "message", "invalid cursor")
+
+        # Json that isn't keys and values is as bad as none at all
+
+        for bad in [[1], {"keys": "+id", "values": [3]}, {"keys": ["+id"]}]:
+            response = self.api.get(f"/cursor?cursor={base64.urlsafe_b64encode(json.dumps(bad).encode()).decode()}")
+            self.assertStatusValue(response, 400, "message", "invalid cursor")
+
+        response = self.api.get("/simple?cursor=WzFd")
+        self.assertStatusValue(response, 400, "message", "invalid cursor")
+
+    def test_sparse(self):
+
+        @relations_restful.exceptions
+        def sparse():
+            return {"sparse": SimpleResource().sparse()}
+
+        self.app.add_url_rule('/sparse', 'sparse', sparse)
+
+        self.assertStatusValue(self.api.get("/sparse"), 200, "sparse", None)
+        self.assertStatusValue(self.api.get("/sparse?fields=name,id"), 200, "sparse", ["name", "id"])
+        self.assertStatusValue(self.api.get("/sparse", json={"fields": ["name"]}), 200, "sparse", ["name"])
+        self.assertStatusValue(self.api.get("/sparse?fields=nope"), 400, "message", "unknown field nope")
+
+    def test_trim(self):
+
+        self.assertEqual(relations_restful.Resource.trim({"a": 1, "b": 2}, None), {"a": 1, "b": 2})
+        self.assertEqual(relations_restful.Resource.trim({"a": 1, "b": 2}, ["b"]), {"b": 2})
+        self.assertEqual(relations_restful.Resource.trim([{"a": 1, "b": 2}, {"a": 3}], ["a"]), [{"a": 1}, {"a": 3}])
+
+    def test_formatting(self):
+
+        @relations_restful.exceptions
+        def formatting():
+            return {"formatting": relations_restful.Resource.formatting()}
+
+        self.app.add_url_rule('/formatting', 'formatting', formatting)
+
+        self.assertStatusValue(self.api.get("/formatting"), 200, "formatting", True)
+        self.assertStatusValue(self.api.get("/formatting?formats=false"), 200, "formatting", False)
+        self.assertStatusValue(self.api.get("/formatting?formats=no", json={"formats": True}), 200, "formatting", True)
+
+    def test_layout(self):
+
+        @relations_restful.exceptions
+        def layout():
+            return {"layout": relations_restful.Resource.layout()}
+
+        self.app.add_url_rule('/layout', 'layout', layout)
+
+        self.assertStatusValue(self.api.get("/layout"), 200, "layout", None)
+        self.assertStatusValue(self.api.get("/layout?layout=Records"), 200, "layout", None)
+        self.assertStatusValue(self.api.get("/layout?layout=rows"), 200, "layout", "rows")
+        self.assertStatusValue(self.api.get("/layout?layout=rows", json={"layout": "COLUMNS"}), 200, "layout", "columns")
+        self.assertStatusValue(self.api.get("/layout?layout=nope"), 400, "message", "unknown layout nope")
+
+    def test_exporting(self):
+
+        @relations_restful.exceptions
+        def exporting():
+            return {"exporting": relations_restful.Resource.exporting()}
+
+        self.app.add_url_rule('/exporting', 'exporting', exporting)
+
+        self.assertStatusValue(self.api.get("/exporting"), 200, "exporting", None)
+        self.assertStatusValue(self.api.get("/exporting?export=CSV"), 200, "exporting", "csv")
+        self.assertStatusValue(self.api.get("/exporting", json={"export": "ndjson"}), 200, "exporting", "ndjson")
+        self.assertStatusValue(self.api.get("/exporting?export=nope"), 400, "message", "unknown export nope")
+        self.assertStatusValue(self.api.get("/exporting", headers={"Accept": "text/csv"}), 200, "exporting", "csv")
+        self.assertStatusValue(self.api.get("/exporting", headers={"Accept": "application/json, text/csv;q=0.5"}), 200, "exporting", None)
+        self.assertStatusValue(self.api.get("/exporting", headers={"Accept": "*/*"}), 200, "exporting", None)
+
+    def test_cell(self):
+
+        self.assertEqual(relations_restful.Resource.cell(None), "")
+        self.assertEqual(relations_restful.Resource.cell(True), "true")
+        self.assertEqual(relations_restful.Resource.cell([1, "a"]), '[1, "a"]')
+        self.assertEqual(relations_restful.Resource.cell({"a": 1}), '{"a": 1}')
+        self.assertEqual(relations_restful.Resource.cell(1.5), 1.5)
+        self.assertEqual(relations_restful.Resource.cell("yep"), "yep")
+
+    def test_heading(self):
+
+        self.assertEqual(PlainResource().heading(None), ["simple_id", "name"])
+        self.assertEqual(PlainResource().heading(["name", "simple_id"]), ["simple_id", "name"])
+        self.assertEqual(PlainResource().heading(["name"]), ["name"])
+
+    def test_tabulate(self):
+
+        simple = Simple("ya").create()
+        simple.plain.add("sure").create()
+        simple.plain.add("whatevs").create()
+
+        plains = Plain.many().sort("name")
+        plains.retrieve()
+
+        self.assertEqual(relations_restful.Resource.tabulate(plains, None), [[1, "sure"], [1, "whatevs"]])
+        self.assertEqual(relations_restful.Resource.tabulate(plains, ["name"]), [["sure"], ["whatevs"]])
+        self.assertEqual(relations_restful.Resource.tabulate(Plain.many(name="nope"), None), [])
+
+    def test_stream(self):
+
+        @relations_restful.exceptions
+        def stream():
+            return {"stream": relations_restful.Resource.stream()}
+
+        self.app.add_url_rule('/stream', 'stream', stream)
+
+        response = self.api.get("/stream")
+        self.assertStatusValue(response, 200, "stream", None)
+
+        response = self.api.get("/stream?stream=yes")
+        self.assertStatusValue(response, 200, "stream", "json")
+
+        response = self.api.get("/stream?stream=NDJSON")
+        self.assertStatusValue(response, 200, "stream", "ndjson")
+
+        response = self.api.get("/stream?stream=json", json={"stream": False})
+        self.assertStatusValue(response, 200, "stream", None)
+
+        response = self.api.get("/stream", json={"stream": "no"})
+        self.assertStatusValue(response, 200, "stream", None)
+
+        class StreamResource(relations_restful.Resource):
+            MODEL = Simple
+            STREAM = True
+
+        @relations_restful.exceptions
+        def streaming():
+            return {"stream": StreamResource.stream()}
+
+        self.app.add_url_rule('/streaming', 'streaming', streaming)
+
+        response = self.api.get("/streaming")
+        self.assertStatusValue(response, 200, "stream", "json")
+
+        response = self.api.get("/streaming?stream=0")
+        self.assertStatusValue(response, 200, "stream", None)
+
     def test_fields(self):
 
         self.assertEqual(SimpleResource().fields(
@@ -660,13 +1399,627 @@ class TestResource(TestRestful):
             }
         ])
 
-    def test_formats(self):
-
-        Simple("ya").create().plain.add("sure").create()
-
-        Simple("whatevs").create()
-
-        self.assertEqual(SimpleResource().formats(Simple.many()), {})
+        self.assertEqual(DoubleResource().fields(
+            likes={},
+            values={
+                "simple_id": 1,
+                "other_id": 3
+            }
+        ).to_list()[1:3], [
+            {
+                "name": "simple_id",
+                "kind": "int",
+                "options": [1],
+                "titles": {
+                    1: ["ya"]
+                },
+                "format": [None],
+                "overflow": True,
+                "required": True,
+                "value": 1
+            },
+            {
+                "name": "other_id",
+                "kind": "int",
+                "options": [2, 3],
+                "titles": {
+                    2: ["sure"],
+                    3: ["whatevs"]
+                },
+                "format": [None],
+                "overflow": True,
+                "required": True,
+                "value": 3
+            }
+        ])
+
+        self.assertRaisesRegex(werkzeug.exceptions.NotFound, "simple: none retrieved", PlainResource().fields, {}, {"simple_id": 9})
+
+    def test_bulk(self):
+
+        @relations_restful.exceptions
+        def bulk():
+            return {"bulk": relations_restful.Resource.bulk()}
+
+        self.app.add_url_rule('/bulk', 'bulk', bulk, methods=["POST"])
+
+        self.assertStatusValue(self.api.post("/bulk"), 200, "bulk", False)
+        self.assertStatusValue(self.api.post("/bulk?bulk=yes"), 200, "bulk", True)
+        self.assertStatusValue(self.api.post("/bulk", json={"bulk": True}), 200, "bulk", True)
+        self.assertStatusValue(self.api.post("/bulk", data="", content_type="application/x-ndjson"), 200, "bulk", True)
+
+    def test_items(self):
+
+        @relations_restful.exceptions
+        def items():
+            return {"items": [
+                item if isinstance(item, dict) else item.description
+                for item in SimpleResource().items()
+            ]}
+
+        self.app.add_url_rule('/items', 'items', items, methods=["POST"])
+
+        self.assertStatusValue(self.api.post("/items"), 200, "items", [])
+        self.assertStatusValue(self.api.post("/items", json={"simples": [{"name": "ya"}]}), 200, "items", [{"name": "ya"}])
+
+        response = self.api.post("/items", data='{"name": "ya"}\n\nnope\n{"name": "sure"}', content_type="application/x-ndjson")
+        self.assertStatusValue(response, 200, "items", [{"name": "ya"}, "invalid json", {"name": "sure"}])
+
+    def test_batch(self):
+
+        cache = relations_restful.MemoryCache()
+        cache.update("simple", {1: ["ya"], 3: ["whatevs"]})
+
+        @relations_restful.exceptions
+        def batch():
+            return {"batch": SimpleResource().batch(list(enumerate(flask.request.json)))}
+
+        self.app.add_url_rule('/batch', 'batch', batch, methods=["POST"])
+
+        self.assertStatusValue(self.api.post("/batch", json=[{"name": "ya"}, {"name": "sure"}]), 200, "batch", [
+            {"index": 0, "status": 201, "id": 1},
+            {"index": 1, "status": 201, "id": 2}
+        ])
+        self.assertEqual(cache.many("simple", [1, 3]), {3: ["whatevs"]})
+
+        with unittest.mock.patch.object(self.source, "create", wraps=self.source.create) as mock_create:
+
+            response = self.api.post("/batch", json=[{"name": "whatevs"}, {"id": "nope"}, {"name": "yep"}])
+            self.assertStatusValue(response, 200, "batch", [
+                {"index": 0, "status": 201, "id": 3},
+                {"index": 1, "status": 400, "message": "invalid literal for int() with base 10: 'nope'"},
+                {"index": 2, "status": 201, "id": 4}
+            ])
+            self.assertEqual(mock_create.call_count, 1)
+
+        self.assertEqual(Simple.many().count(), 4)
+
+        # A failed create isn't retried item by item, which could create some twice
+
+        with unittest.mock.patch.object(self.source, "create", side_effect=Exception("gone away")) as mock_create, \
+             unittest.mock.patch("relations_restful.resource.log") as mock_log:
+
+            response = self.api.post("/batch", json=[{"name": "again"}, {"id": "nope"}, {"name": "more"}])
+            self.assertStatusValue(response, 200, "batch", [
+                {"index": 0, "status": 500, "message": "gone away"},
+                {"index": 1, "status": 400, "message": "invalid literal for int() with base 10: 'nope'"},
+                {"index": 2, "status": 500, "message": "gone away"}
+            ])
+            self.assertEqual(mock_create.call_count, 1)
+            self.assertEqual(mock_log.call_count, 1)
+
+        self.assertEqual(Simple.many().count(), 4)
+
+        @relations_restful.exceptions
+        def invalid():
+            return {"batch": SimpleResource().batch([(0, werkzeug.exceptions.BadRequest("invalid json"))])}
+
+        self.app.add_url_rule('/invalid', 'invalid', invalid, methods=["POST"])
+
+        self.assertStatusValue(self.api.post("/invalid"), 200, "batch", [{"index": 0, "status": 400, "message": "invalid json"}])
+
+        @relations_restful.exceptions
+        def plain():
+            return {"batch": PlainResource().batch([(0, {"name": "ya"})])}
+
+        self.app.add_url_rule('/plain_batch', 'plain_batch', plain, methods=["POST"])
+
+        self.assertStatusValue(self.api.post("/plain_batch"), 200, "batch", [{"index": 0, "status": 201}])
+
+    def test_ingest(self):
+
+        class IngestResource(relations_restful.Resource):
+            MODEL = Simple
+            BULK = 3
+
+        @relations_restful.exceptions
+        def ingest():
+            return IngestResource().ingest(iter(flask.request.json))
+
+        self.app.add_url_rule('/ingest', 'ingest', ingest, methods=["POST"])
+
+        with unittest.mock.patch.object(self.source, "create", wraps=self.source.create) as mock_create:
+
+            response = self.api.post("/ingest", json=[{"name": name} for name in "abcdefg"])
+            self.assertStatusValue(response, 201, "created", 7)
+            self.assertStatusValue(response, 201, "failed", 0)
+            self.assertEqual([result["id"] for result in response.json["simples"]], [1, 2, 3, 4, 5, 6, 7])
+            self.assertEqual(mock_create.call_count, 3)
+
+        response = self.api.post("/ingest", json=[{"name": "h"}, {"id": "nope"}])
+        self.assertStatusValue(response, 207, "created", 1)
+        self.assertStatusValue(response, 207, "failed", 1)
+
+    def test_amend(self):
+
+        class AmendResource(relations_restful.Resource):
+            MODEL = Simple
+            BULK = 2
+
+        for name in "abcde":
+            Simple(name).create()
+
+        cache = relations_restful.MemoryCache()
+        cache.update("simple", {1: ["a"], 5: ["e"]})
+
+        @relations_restful.exceptions
+        def amend():
+            return AmendResource().amend(flask.request.json)
+
+        self.app.add_url_rule('/amend', 'amend', amend, methods=["PATCH"])
+
+        with unittest.mock.patch.object(self.source, "update", wraps=self.source.update) as mock_update:
+
+            response = self.api.patch("/amend", json=[
+                {"id": 1, "changes": {"name": "yes"}},
+                {"id": 2, "changes": {"name": "no"}},
+                {"id": 3, "changes": {"name": "yes"}},
+                {"id": 4, "changes": {"name": "yes"}}
+            ])
+            self.assertStatusValue(response, 202, "updated", 4)
+            self.assertStatusValue(response, 202, "batches", [
+                {"ids": [1, 3], "updated": 2},
+                {"ids": [4], "updated": 1},
+                {"ids": [2], "updated": 1}
+            ])
+            self.assertEqual(mock_update.call_count, 3)
+
+        self.assertEqual([simple.name for simple in Simple.many().sort("id")], ["yes", "no", "yes", "yes", "e"])
+        self.assertEqual(cache.many("simple", [1, 5]), {5: ["e"]})
+
+        response = self.api.patch("/amend", json=[{"id": 1}])
+        self.assertStatusValue(response, 400, "message", "each of simples needs id and changes")
+
+        # A bad item anywhere stops them all, so none are half applied
+
+        with unittest.mock.patch.object(self.source, "update", wraps=self.source.update) as mock_update:
+
+            response = self.api.patch("/amend", json=[
+                {"id": 1, "changes": {"name": "Q"}},
+                {"id": 2, "changes": {"nope": "Q"}}
+            ])
+            self.assertStatusValue(response, 400, "message", "simples 2: unknown field 'nope'")
+
+            response = self.api.patch("/amend", json=[
+                {"id": 1, "changes": {"name": "Q"}},
+                {"id": "x", "changes": {"name": "Q"}}
+            ])
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json["message"].startswith("simples x: "))
+
+            mock_update.assert_not_called()
+
+        self.assertEqual(Simple.one(1).name, "yes")
+
+        @relations_restful.exceptions
+        def plain():
+            return PlainResource().amend([])
+
+        self.app.add_url_rule('/plain_amend', 'plain_amend', plain, methods=["PATCH"])
+
+        self.assertStatusValue(self.api.patch("/plain_amend"), 400, "message", "plains need an id to update as a list")
+
+    def test_upsert(self):
+
+        Simple("ya").create()
+        Simple("sure").create()
+
+        cache = relations_restful.MemoryCache()
+        cache.update("simple", {1: ["ya"], 2: ["sure"]})
+
+        class NameResource(relations_restful.Resource):
+            MODEL = Simple
+            UNIQUE = "name"
+
+        @relations_restful.exceptions
+        def upsert():
+            resource = NameResource() if "name" in flask.request.args else SimpleResource()
+            upserted, created, updated, failed = resource.upsert(flask.request.json)
+            return {"upserted": upserted, "created": created, "updated": updated, "failed": failed}
+
+        self.app.add_url_rule('/upsert', 'upsert', upsert, methods=["PUT"])
+
+        with unittest.mock.patch.object(self.source, "retrieve", wraps=self.source.retrieve) as mock_retrieve, \
+             unittest.mock.patch.object(self.source, "create", wraps=self.source.create) as mock_create, \
+             unittest.mock.patch.object(self.source, "update", wraps=self.source.update) as mock_update:
+
+            response = self.api.put("/upsert", json=[
+                {"id": "1", "name": "yep"},
+                {"name": "new"},
+                {"id": 5, "name": "five"},
+                {"id": 2, "name": "sure"}
+            ])
+            self.assertStatusValue(response, 200, "upserted", [
+                {"id": 1, "name": "yep"},
+                {"id": 3, "name": "new"},
+                {"id": 2, "name": "sure"}
+            ])
+            self.assertStatusValue(response, 200, "created", 1)
+            self.assertStatusValue(response, 200, "updated", 2)
+            self.assertStatusValue(response, 200, "failed", [{"index": 2, "status": 404, "message": "simple: none retrieved"}])
+            self.assertEqual(mock_retrieve.call_count, 1)
+            self.assertEqual(mock_create.call_count, 1)
+            self.assertEqual(mock_update.call_count, 1)
+
+        self.assertEqual(Simple.one(id=1).name, "yep")
+        self.assertEqual(cache.many("simple", [1, 2]), {})
+
+        response = self.api.put("/upsert?name=yes", json=[{"name": "new"}, {"name": "six"}, {"name": "six"}])
+        self.assertStatusValue(response, 200, "upserted", [
+            {"id": 3, "name": "new"},
+            {"id": 4, "name": "six"},
+            {"id": 4, "name": "six"}
+        ])
+        self.assertStatusValue(response, 200, "created", 1)
+        self.assertStatusValue(response, 200, "updated", 1)
+
+        @relations_restful.exceptions
+        def plain():
+            return {"upserted": PlainResource().upsert([{"name": "ya"}])[0]}
+
+        self.app.add_url_rule('/plain_upsert', 'plain_upsert', plain, methods=["PUT"])
+
+        self.assertStatusValue(self.api.put("/plain_upsert"), 400, "message", "plains need an id or unique fields to upsert")
+
+    def test_plan(self):
+
+        fields = opengui.Fields(values={"simple_id": 1, "other_id": 2}, fields=DoubleResource()._fields)
+
+        plan = DoubleResource().plan(fields, {"other_id": "y"})
+
+        self.assertEqual(list(plan.keys()), [(Simple, "id")])
+        self.assertEqual(plan[(Simple, "id")]["relation"].child_field, "simple_id")
+        self.assertEqual(plan[(Simple, "id")]["pages"], {None: None, "y": None})
+        self.assertEqual(plan[(Simple, "id")]["values"], [1])
+        self.assertIsNone(plan[(Simple, "id")]["titles"])
+
+    def test_gather(self):
+
+        self.assertEqual(SimpleResource().gather({"a": lambda: 1, "b": lambda: 2}), {"a": 1, "b": 2})
+
+        class GatherResource(relations_restful.Resource):
+            MODEL = Simple
+            EXECUTOR = concurrent.futures.ThreadPoolExecutor(2)
+            TIMEOUT = 5
+
+        # Both have to be waiting at once to get past the barrier
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        def lookup(value):
+            barrier.wait()
+            return (flask.request.args["a"], value)
+
+        def fail():
+            raise relations.ModelError(Simple.thy(), "none retrieved")
+
+        def slow(seconds=0.5):
+            time.sleep(seconds)
+
+        @relations_restful.exceptions
+        def gather():
+            if "fail" in flask.request.args:
+                return {"gather": GatherResource().gather({"a": lambda: 1, "b": fail})}
+            if "slow" in flask.request.args:
+                resource = GatherResource()
+                resource.TIMEOUT = 0.1
+                return {"gather": resource.gather({"a": slow, "b": slow})}
+            if "staggered" in flask.request.args:
+                resource = GatherResource()
+                resource.TIMEOUT = 0.3
+                return {"gather": resource.gather({"a": functools.partial(slow, 0.2), "b": functools.partial(slow, 0.5)})}
+            return {"gather": GatherResource().gather({"a": functools.partial(lookup, 1), "b": functools.partial(lookup, 2)})}
+
+        self.app.add_url_rule('/gather', 'gather', gather)
+
+        self.assertStatusValue(self.api.get("/gather?a=b"), 200, "gather", {"a": ["b", 1], "b": ["b", 2]})
+        self.assertStatusValue(self.api.get("/gather?fail=yes"), 404, "message", "simple: none retrieved")
+        self.assertStatusValue(self.api.get("/gather?slow=yes"), 504, "message", "lookups timed out")
+
+        # Each finishing within TIMEOUT of the one before isn't enough, all have to within TIMEOUT
+
+        start = time.perf_counter()
+        self.assertStatusValue(self.api.get("/gather?staggered=yes"), 504, "message", "lookups timed out")
+        self.assertLess(time.perf_counter() - start, 0.45)
+
+        GatherResource.EXECUTOR.shutdown()
+
+    def test_look(self):
+
+        Simple("ya").create()
+        Simple("sure").create()
+        Simple("whatevs").create()
+
+        resource = DoubleResource()
+
+        fields = opengui.Fields(values={"simple_id": 1}, fields=resource._fields)
+        lookup = resource.plan(fields, {"other_id": "wh"})[(Simple, "id")]
+
+        self.assertIs(resource.look(lookup), lookup)
+        self.assertEqual(lookup["pages"][None][0].ids, [2, 3])
+        self.assertEqual(lookup["pages"]["wh"][0].ids, [3])
+        self.assertFalse(lookup["pages"]["wh"][1])
+        self.assertEqual(lookup["titles"], {"titles": {1: ["ya"]}, "format": [None]})
+
+    def test_lookup(self):
+
+        Simple("ya").create()
+        Simple("sure").create()
+        Simple("whatevs").create()
+
+        resource = DoubleResource()
+
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            fields = opengui.Fields(values={"simple_id": 1, "other_id": 3}, fields=resource._fields)
+
+            plan = resource.lookup(resource.plan(fields, {}))
+
+            lookup = plan[(Simple, "id")]
+            self.assertEqual(lookup["pages"][None][0].ids, [2, 3])
+            self.assertTrue(lookup["pages"][None][1])
+            self.assertEqual(lookup["titles"], {"titles": {1: ["ya"]}, "format": [None]})
+            self.assertEqual(mock_titles.call_count, 2)
+
+            mock_titles.reset_mock()
+
+            fields = opengui.Fields(values={"simple_id": 2, "other_id": 3}, fields=resource._fields)
+
+            plan = resource.lookup(resource.plan(fields, {}))
+
+            self.assertIsNone(plan[(Simple, "id")]["titles"])
+            self.assertEqual(mock_titles.call_count, 1)
+
+    def test_known(self):
+
+        self.assertEqual(SimpleResource().known("simple"), {})
+
+        @relations_restful.exceptions
+        def known():
+            SimpleResource().known("simple")[1] = ["ya"]
+            return {"known": [SimpleResource().known("simple"), PlainResource().known("plain")]}
+
+        self.app.add_url_rule('/known', 'known', known)
+
+        self.assertStatusValue(self.api.get("/known"), 200, "known", [{"1": ["ya"]}, {}])
+
+    def test_titles(self):
+
+        Simple("ya").create()
+        Simple("sure").create()
+
+        relation = Plain.thy()._ancestor("simple_id")
+
+        self.assertEqual(PlainResource().titles(relation, [1, 2]), {
+            "titles": {1: ["ya"], 2: ["sure"]},
+            "format": [None]
+        })
+
+        class CachePlainResource(relations_restful.Resource):
+            MODEL = Plain
+            CACHE = relations_restful.MemoryCache()
+
+        resource = CachePlainResource()
+
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            self.assertEqual(resource.titles(relation, [1, None, 1]), {
+                "titles": {1: ["ya"]},
+                "format": [None]
+            })
+            self.assertEqual(mock_titles.call_count, 1)
+
+            self.assertEqual(resource.titles(relation, 1), {
+                "titles": {1: ["ya"]},
+                "format": [None]
+            })
+            self.assertEqual(mock_titles.call_count, 1)
+
+            self.assertEqual(resource.titles(relation, [1, 2]), {
+                "titles": {1: ["ya"], 2: ["sure"]},
+                "format": [None]
+            })
+            self.assertEqual(mock_titles.call_count, 2)
+
+        self.assertEqual(CachePlainResource.CACHE.stats(), {"hits": 4, "misses": 3, "size": 3, "bytes": 0})
+
+        @relations_restful.exceptions
+        def titles():
+            resource = PlainResource()
+            return {"titles": [resource.titles(relation, [1, None]), resource.titles(relation, [2, 1])]}
+
+        self.app.add_url_rule('/titles', 'titles', titles)
+
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            self.assertStatusValue(self.api.get("/titles"), 200, "titles", [
+                {"titles": {"1": ["ya"]}, "format": [None]},
+                {"titles": {"2": ["sure"], "1": ["ya"]}, "format": [None]}
+            ])
+            self.assertEqual(mock_titles.call_count, 2)
+
+    def test_invalidate(self):
+
+        cache = relations_restful.MemoryCache()
+        cache.update("simple", {1: ["ya"], 2: ["sure"]})
+        cache.update("plain", {1: ["whatevs"]})
+
+        SimpleResource().invalidate([1])
+        self.assertEqual(cache.many("simple", [1, 2]), {2: ["sure"]})
+
+        SimpleResource().invalidate()
+        self.assertEqual(cache.many("simple", [2]), {})
+
+        PlainResource().invalidate([1])
+        self.assertEqual(cache.many("plain", [1]), {})
+
+        cache.update("simple", {1: ["ya"], 2: ["sure"]})
+
+        self.api.post("/simple", json={"simple": {"name": "ya"}})
+        self.assertEqual(cache.many("simple", [1, 2]), {2: ["sure"]})
+
+        self.api.post("/simple", json={"simples": [{"name": "sure"}]})
+        self.assertEqual(cache.many("simple", [2]), {})
+
+        cache.update("simple", {1: ["ya"], 2: ["sure"]})
+
+        self.api.patch("/simple/1", json={"simple": {"name": "yep"}})
+        self.assertEqual(cache.many("simple", [1, 2]), {2: ["sure"]})
+
+        self.api.patch("/simple", json={"filter": {"name": "sure"}, "simples": {"name": "whatever"}})
+        self.assertEqual(cache.many("simple", [2]), {})
+
+        cache.update("simple", {1: ["yep"], 2: ["whatever"]})
+
+        self.api.delete("/simple/1")
+        self.assertEqual(cache.many("simple", [1, 2]), {2: ["whatever"]})
+
+        self.api.delete("/simple", json={"filter": {}})
+        self.assertEqual(cache.many("simple", [2]), {})
+
+    def test_recall(self):
+
+        class RecallResource(relations_restful.Resource):
+            MODEL = Simple
+            RESPONSES = relations_restful.MemoryCache()
+
+        @relations_restful.exceptions
+        def recall():
+            return {"recall": [SimpleResource().recall(), RecallResource().recall(1)]}
+
+        self.app.add_url_rule('/recall', 'recall', recall)
+
+        self.assertStatusValue(self.api.get("/recall"), 200, "recall", [None, None])
+
+        with self.app.test_request_context("/recall"):
+            key = relations_restful.ResourceSpec.current().key(RecallResource.responding(), 1)
+
+        RecallResource.RESPONSES.update("simple:responses", {key: ({"a": 1}, "b")})
+
+        self.assertStatusValue(self.api.get("/recall"), 200, "recall", [None, [{"a": 1}, "b"]])
+        self.assertStatusValue(self.api.get("/recall?sort=id"), 200, "recall", [None, None])
+
+    def test_responding(self):
+
+        self.assertEqual(SimpleResource.responding(), "test_relations_restful.test_resource.SimpleResource")
+
+    def test_remember(self):
+
+        class RememberResource(relations_restful.Resource):
+            MODEL = Simple
+            RESPONSES = relations_restful.MemoryCache()
+
+        @relations_restful.exceptions
+        def remember():
+            SimpleResource().remember(1, {"a": 1}, "b")
+            RememberResource().remember(1, {"a": 1}, "b")
+            return {"remember": RememberResource().recall(1)}
+
+        self.app.add_url_rule('/remember', 'remember', remember)
+
+        self.assertStatusValue(self.api.get("/remember?a=1"), 200, "remember", [{"a": 1}, "b"])
+        self.assertEqual(len(RememberResource.RESPONSES), 1)
+
+    def test_digest(self):
+
+        self.assertEqual(relations_restful.Resource.digest({"a": 1}), "e4ad4daad53a2eec0313386ada88211e50d693bd")
+
+    def test_etag(self):
+
+        simple = Simple("ya").create()
+
+        self.assertEqual(SimpleResource().etag(Simple.one(id=simple.id)), relations_restful.Resource.digest({"id": 1, "name": "ya"}))
+
+        class VersionResource(relations_restful.Resource):
+            MODEL = Simple
+            VERSION = "name"
+
+        self.assertEqual(VersionResource().etag(Simple.one(id=simple.id)), relations_restful.Resource.digest([1, "ya"]))
+
+    def test_unmodified(self):
+
+        @relations_restful.exceptions
+        def unmodified():
+            response = relations_restful.Resource.unmodified("abc")
+            return response if response is not None else {"unmodified": None}
+
+        self.app.add_url_rule('/unmodified', 'unmodified', unmodified)
+
+        self.assertStatusValue(self.api.get("/unmodified"), 200, "unmodified", None)
+        self.assertStatusValue(self.api.get("/unmodified", headers={"If-None-Match": '"def"'}), 200, "unmodified", None)
+
+        response = self.api.get("/unmodified", headers={"If-None-Match": '"def", W/"abc"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"abc"')
+
+        response = self.api.get("/unmodified", headers={"If-None-Match": '"def", "abc-msgpack-gzip"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"abc-msgpack-gzip"')
+
+        response = self.api.get("/unmodified", headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"abc"')
+
+        self.assertStatusValue(self.api.get("/unmodified", headers={"If-None-Match": '"abcd-gzip"'}), 200, "unmodified", None)
+
+    def test_match(self):
+
+        simple = Simple("ya").create()
+        etag = SimpleResource().etag(Simple.one(id=simple.id))
+
+        @relations_restful.exceptions
+        def match():
+            SimpleResource().match(Simple.one(id=simple.id))
+            return {"match": True}
+
+        self.app.add_url_rule('/match', 'match', match)
+
+        self.assertStatusValue(self.api.get("/match"), 200, "match", True)
+        self.assertStatusValue(self.api.get("/match", headers={"If-Match": f'"{etag}"'}), 200, "match", True)
+        self.assertStatusValue(self.api.get("/match", headers={"If-Match": "*"}), 200, "match", True)
+        self.assertStatusValue(self.api.get("/match", headers={"If-Match": '"nope"'}), 412, "message", "simple has changed")
+        self.assertStatusValue(self.api.get("/match", headers={"If-Match": f'"{etag}-gzip"'}), 200, "match", True)
+        self.assertStatusValue(self.api.get("/match", headers={"If-Match": f'W/"{etag}"'}), 412, "message", "simple has changed")
+
+    def test_variant(self):
+
+        self.assertEqual(relations_restful.Resource.variant("abc", None, {}), f"abc.{relations_restful.Resource.digest([None, {}])}")
+        self.assertNotEqual(relations_restful.Resource.variant("abc", None, {}), relations_restful.Resource.variant("abc", None, None))
+        self.assertNotEqual(relations_restful.Resource.variant("abc", ["id"], None), relations_restful.Resource.variant("abc", None, None))
+
+    def test_plain(self):
+
+        self.assertEqual(relations_restful.Resource.plain("abc"), "abc")
+        self.assertEqual(relations_restful.Resource.plain("abc-gzip"), "abc")
+        self.assertEqual(relations_restful.Resource.plain("abc-msgpack-deflate"), "abc")
+
+    def test_formats(self):
+
+        Simple("ya").create().plain.add("sure").create()
+
+        Simple("whatevs").create()
+
+        self.assertEqual(SimpleResource().formats(Simple.many()), {})
 
         self.assertEqual(PlainResource().formats(Plain.many()), {
             "simple_id": {
@@ -682,6 +2035,8 @@ class TestResource(TestRestful):
             }
         })
 
+        self.assertEqual(PlainResource().formats(Plain.many(), ["name"]), {})
+
         class Advanced(ResourceModel):
             id = int
             name = str
@@ -690,29 +2045,390 @@ class TestResource(TestRestful):
 
         class AdvancedResource(relations_restful.Resource):
 
-            MODEL = Advanced
+            MODEL = Advanced
+
+            FIELDS = [
+                {
+                    "name": "status",
+                    "titles": {
+                        "good": "Good",
+                        "bad": "Bad"
+                    }
+                }
+            ]
+
+        self.assertEqual(AdvancedResource().formats(Advanced.many()), {
+            "status": {
+                "titles": {
+                    "good": "Good",
+                    "bad": "Bad"
+                },
+            },
+            "created": {
+                "format": ["datetime"]
+            }
+        })
+
+    def test_keys(self):
+
+        self.assertEqual(SimpleResource().keys([]), ["+name", "+id"])
+        self.assertEqual(SimpleResource().keys(["-id"]), ["-id"])
+        self.assertEqual(SimpleResource().keys(["-name", "+id"]), ["-name", "+id"])
+        self.assertEqual(PlainResource().keys(["name"]), ["+name"])
+        self.assertRaisesRegex(relations.ModelError, "unknown sort field nope", SimpleResource().keys, ["nope"])
+
+    def test_position(self):
+
+        self.assertEqual(
+            SimpleResource().position(["-name", "+id"], Simple("ya", id=3)),
+            {"keys": ["-name", "+id"], "values": ["ya", 3]}
+        )
+
+        self.assertEqual(
+            NetResource().position(["+ip__value", "+id"], Net(id=3, ip=ipaddress.IPv4Address("1.2.3.4"))),
+            {"keys": ["+ip__value", "+id"], "values": [16909060, 3]}
+        )
+
+    def test_marker(self):
+
+        marker = SimpleResource().marker(["-name", "+id"], Simple("ya", id=3))
+
+        self.assertEqual(
+            relations_restful.resource.json.loads(relations_restful.resource.base64.urlsafe_b64decode(marker)),
+            SimpleResource().position(["-name", "+id"], Simple("ya", id=3))
+        )
+
+        marker = NetResource().marker(["+ip", "+id"], Net(id=3, ip=ipaddress.IPv4Address("1.2.3.4")))
+
+        self.assertEqual(
+            relations_restful.resource.json.loads(relations_restful.resource.base64.urlsafe_b64decode(marker)),
+            {"keys": ["+ip", "+id"], "values": [{"address": "1.2.3.4", "value": 16909060}, 3]}
+        )
+
+    def test_unmark(self):
+
+        self.assertEqual(
+            NetResource().unmark(["+ip", "+id", "+ip__value"], [{"address": "1.2.3.4", "value": 16909060}, 3, 16909060]),
+            [ipaddress.IPv4Address("1.2.3.4"), 3, 16909060]
+        )
+
+    def test_seek(self):
+
+        for name in ["b", "a", "b", "a", "c"]:
+            Simple(name).create()
+
+        resource = SimpleResource()
+
+        keys = ["+name", "+id"]
+
+        models = resource.seek({"keys": keys, "values": ["a", 2]}, {}, keys, {"limit": 2})
+        self.assertEqual(models.id, [4, 1])
+        self.assertTrue(models.overflow)
+
+        models = resource.seek({"keys": keys, "values": ["b", 1]}, {}, keys, {"limit": 2})
+        self.assertEqual(models.id, [3, 5])
+        self.assertTrue(models.overflow)
+
+        models = resource.seek({"keys": keys, "values": ["b", 3]}, {}, keys, {"limit": 2})
+        self.assertEqual(models.id, [5])
+        self.assertFalse(models.overflow)
+
+        models = resource.seek({"keys": keys, "values": ["a", 2]}, {"name__in": ["a", "c"]}, keys, {"per_page": 3})
+        self.assertEqual(models.id, [4, 5])
+        self.assertFalse(models.overflow)
+
+        models = resource.seek({"keys": ["-id"], "values": [3]}, {}, ["-id"], {})
+        self.assertEqual(models.id, [2, 1])
+
+        self.assertRaisesRegex(werkzeug.exceptions.BadRequest, "cursor doesn't match sort", resource.seek, {"keys": ["-id"], "values": [3]}, {}, keys, {})
+        self.assertRaisesRegex(werkzeug.exceptions.BadRequest, "invalid cursor", resource.seek, {"keys": ["-id"], "values": ["nope"]}, {}, ["-id"], {})
+
+    def test_counted(self):
+
+        for name in ["a", "b", "c", "d", "e"]:
+            Simple(name).create()
+
+        resource = SimpleResource()
+
+        with unittest.mock.patch.object(self.source, "count", wraps=self.source.count) as mock_count:
+
+            models = Simple.many().limit(10)
+            models.export()
+            self.assertEqual(resource.counted(models, {}, {"limit": 10}), 5)
+
+            models = Simple.many().limit(2, start=4)
+            models.export()
+            self.assertEqual(resource.counted(models, {}, {"limit": 2, "start": 4}), 5)
+
+            models = Simple.many().limit(per_page=2, page=3)
+            models.export()
+            self.assertEqual(resource.counted(models, {}, {"per_page": 2, "page": 3}), 5)
+
+            models = Simple.many(name="z").limit()
+            models.export()
+            self.assertEqual(resource.counted(models, {"name": "z"}, {}), 0)
+
+            self.assertEqual(mock_count.call_count, 0)
+
+            models = Simple.many().limit(2)
+            models.export()
+            self.assertEqual(resource.counted(models, {}, {"limit": 2}), 5)
+
+            models = Simple.many().limit(2, start=10)
+            models.export()
+            self.assertEqual(resource.counted(models, {}, {"limit": 2, "start": 10}), 5)
+
+            models = Simple.many(name__in=["d", "e"]).limit(2)
+            models.export()
+            self.assertEqual(resource.counted(models, {"name__in": ["d", "e"]}, {"limit": 3}, {"keys": ["+id"], "values": [3]}), 2)
+
+            self.assertEqual(mock_count.call_count, 3)
+
+    def test_checked(self):
+
+        resource = SimpleResource()
+
+        with unittest.mock.patch.object(self.source, "retrieve") as retrieve:
+
+            self.assertEqual(resource.checked({"name": "a"}, ["-name"]), ["-name", "+id"])
+
+            retrieve.assert_not_called()
+
+        self.assertRaisesRegex(relations.ModelError, "simple: unknown sort field nope", resource.checked, {}, ["nope"])
+        self.assertRaisesRegex(relations.RecordError, "unknown criterion 'nope'", resource.checked, {"nope": 1}, [])
+
+    def test_chunks(self):
+
+        for name in ["e", "d", "c", "b", "a"]:
+            Simple(name).create()
+
+        resource = SimpleResource()
+
+        self.assertEqual(
+            [models.name for models in resource.chunks({}, [], None)],
+            [["a", "b"], ["c", "d"], ["e"]]
+        )
+
+        self.assertEqual(
+            [models.id for models in resource.chunks({}, ["-id"], {"limit": 3, "start": 1})],
+            [[4, 3], [2]]
+        )
+
+        self.assertEqual(
+            [models.id for models in resource.chunks({"name__in": ["a", "b"]}, [], {"per_page": 2, "page": 1})],
+            [[5, 4]]
+        )
+
+        self.assertEqual(
+            [models.id for models in resource.chunks({"name": "z"}, [], {})],
+            [[]]
+        )
+
+        self.assertEqual(
+            [models.name for models in PlainResource().chunks({}, [], None)],
+            [[]]
+        )
+
+        # Only the first chunk offsets, the rest seek past the last of the chunk before
+
+        with unittest.mock.patch.object(resource, "seek", wraps=resource.seek) as seek:
+
+            self.assertEqual(
+                [models.id for models in resource.chunks({}, ["-id"], {"limit": 4, "start": 1})],
+                [[4, 3], [2, 1]]
+            )
+
+            seek.assert_called_once_with({"keys": ["-id"], "values": [3]}, {}, ["-id"], {"limit": 2})
+
+        for name in ["x", "y", "z"]:
+            Plain(name=name).create()
+
+        plain = PlainResource()
+
+        with unittest.mock.patch.object(plain._model, "CHUNK", 2):
+            self.assertEqual(
+                [models.name for models in plain.chunks({}, ["name"], None)],
+                [["x", "y"], ["z"]]
+            )
+
+    def test_streamed(self):
+
+        simple = Simple("ya").create()
+        simple.plain.add("sure").create()
+        simple.plain.add("whatevs").create()
+        Simple("fine").create().plain.add("ok").create()
+
+        @relations_restful.exceptions
+        def streamed():
+            return PlainResource().streamed(flask.request.args["stream"], {}, ["name"], None, None, flask.request.args.get("layout"))
+
+        self.app.add_url_rule('/streamed', 'streamed', streamed)
+
+        response = self.api.get("/streamed?stream=json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.json, {
+            "plains": [
+                {"simple_id": 2, "name": "ok"},
+                {"simple_id": 1, "name": "sure"},
+                {"simple_id": 1, "name": "whatevs"}
+            ],
+            "overflow": False,
+            "formats": {
+                "simple_id": {
+                    "titles": {"1": ["ya"], "2": ["fine"]},
+                    "format": [None]
+                }
+            }
+        })
+
+        response = self.api.get("/streamed?stream=ndjson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(response.get_data(as_text=True).splitlines(), [
+            '{"simple_id": 2, "name": "ok"}',
+            '{"simple_id": 1, "name": "sure"}',
+            '{"simple_id": 1, "name": "whatevs"}'
+        ])
+
+        response = self.api.get("/streamed?stream=json&layout=rows")
+        self.assertEqual(response.json, {
+            "plains": {
+                "fields": ["simple_id", "name"],
+                "rows": [[2, "ok"], [1, "sure"], [1, "whatevs"]]
+            },
+            "overflow": False,
+            "formats": {
+                "simple_id": {
+                    "titles": {"1": ["ya"], "2": ["fine"]},
+                    "format": [None]
+                }
+            }
+        })
+
+        response = self.api.get("/streamed?stream=ndjson&layout=rows")
+        self.assertEqual(response.get_data(as_text=True).splitlines(), [
+            '["simple_id", "name"]',
+            '[2, "ok"]',
+            '[1, "sure"]',
+            '[1, "whatevs"]'
+        ])
+
+        # A bad sort or criterion fails before anything's streamed, with the same error as a page
+
+        response = self.api.get("/simple?stream=true&sort=nope")
+        self.assertStatusValue(response, 500, "message", "simple: unknown sort field nope")
+        self.assertEqual(response.json["code"], "model_error")
+
+        response = self.api.get("/simple?stream=ndjson&nope=1")
+        self.assertStatusValue(response, 500, "message", "unknown criterion 'nope'")
+        self.assertEqual(response.json["code"], "internal_error")
+
+    def test_exported(self):
+
+        class ExportResource(relations_restful.Resource):
+            MODEL = Plain
+            LIST = ["name", "simple_id"]
+
+        class Sheet(ResourceModel):
+            id = int
+            name = str
+            flag = bool
+            people = set
+            things = dict
+
+        class SheetResource(relations_restful.Resource):
+            MODEL = Sheet
+            LIST = ["name", "flag", "people", "things__a"]
+
+        simple = Simple("ya").create()
+        simple.plain.add("sure").create()
+        simple.plain.add("whatevs").create()
+        Simple("fine").create().plain.add("ok").create()
+        Plain(name="orphan").create()
+
+        Sheet(name="yep", flag=True, people={"tom"}, things={"a": {"b": 1}}).create()
+        Sheet(name="nope", flag=False).create()
+
+        @relations_restful.exceptions
+        def exported():
+            args = flask.request.args
+            resource = SheetResource() if "sheet" in args else ExportResource()
+            limit = {"limit": int(args["limit"])} if "limit" in args else None
+            return resource.exported(args["export"], {}, ["name"], limit, "titled" in args)
+
+        self.app.add_url_rule('/exported', 'exported', exported)
+
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            response = self.api.get("/exported?export=csv")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "text/csv")
+            self.assertEqual(response.headers["Content-Disposition"], 'attachment; filename="plains.csv"')
+            self.assertEqual(response.get_data(as_text=True).splitlines(), [
+                "name,simple_id",
+                "ok,2",
+                "orphan,",
+                "sure,1",
+                "whatevs,1"
+            ])
+            self.assertEqual(mock_titles.call_count, 0)
+
+            response = self.api.get("/exported?export=csv&titled=yes")
+            self.assertEqual(response.get_data(as_text=True).splitlines(), [
+                "name,simple_id,simple_id_title",
+                "ok,2,fine",
+                "orphan,,",
+                "sure,1,ya",
+                "whatevs,1,ya"
+            ])
+            self.assertEqual(mock_titles.call_count, 1)
+
+        response = self.api.get("/exported?export=ndjson&titled=yes&limit=3")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in response.get_data(as_text=True).splitlines()], [
+            {"name": "ok", "simple_id": 2, "simple_id_title": "fine"},
+            {"name": "orphan", "simple_id": None, "simple_id_title": ""},
+            {"name": "sure", "simple_id": 1, "simple_id_title": "ya"}
+        ])
+
+        response = self.api.get("/exported?export=csv&limit=0")
+        self.assertEqual(response.get_data(as_text=True).splitlines(), ["name,simple_id"])
+
+        response = self.api.get("/exported?export=csv&sheet=yes")
+        self.assertEqual(response.get_data(as_text=True).splitlines(), [
+            "name,flag,people,things__a",
+            'nope,false,[],',
+            'yep,true,"[""tom""]","{""b"": 1}"'
+        ])
+
+        # Each chunk after the first seeks past the one before
+
+        resource = SimpleResource()
+
+        with self.app.test_request_context("/"), unittest.mock.patch.object(resource, "seek", wraps=resource.seek) as seek:
+
+            response = resource.exported("csv", {}, ["-id"])
+
+            self.assertEqual(response.get_data(as_text=True).splitlines(), ["id,name", "2,fine", "1,ya"])
+            self.assertEqual(seek.call_count, 1)
+
+            Simple("more").create()
+
+            response = resource.exported("csv", {}, ["-id"])
+
+            self.assertEqual(response.get_data(as_text=True).splitlines(), ["id,name", "3,more", "2,fine", "1,ya"])
+            seek.assert_called_with({"keys": ["-id"], "values": [2]}, {}, ["-id"], {"limit": 2})
+
+        # A bad sort or criterion fails before anything's exported
 
-            FIELDS = [
-                {
-                    "name": "status",
-                    "titles": {
-                        "good": "Good",
-                        "bad": "Bad"
-                    }
-                }
-            ]
+        response = self.api.get("/simple?export=csv&sort=nope")
+        self.assertStatusValue(response, 500, "message", "simple: unknown sort field nope")
+        self.assertEqual(response.json["code"], "model_error")
 
-        self.assertEqual(AdvancedResource().formats(Advanced.many()), {
-            "status": {
-                "titles": {
-                    "good": "Good",
-                    "bad": "Bad"
-                },
-            },
-            "created": {
-                "format": ["datetime"]
-            }
-        })
+        response = self.api.get("/simple?export=csv&nope=1")
+        self.assertStatusValue(response, 500, "message", "unknown criterion 'nope'")
+        self.assertEqual(response.json["code"], "internal_error")
 
     def test_options(self):
 
@@ -900,6 +2616,79 @@ class TestResource(TestRestful):
         response = self.api.post("/simple", json={"filter": {"name": "ya"}, "count": True})
         self.assertStatusModel(response, 200, "simples", 1)
 
+        response = self.api.post("/simple", json={"simples": [{"name": "sure"}, {"name": "whatevs"}], "bulk": True})
+        self.assertStatusValue(response, 201, "simples", [{"index": 0, "status": 201, "id": 2}, {"index": 1, "status": 201, "id": 3}])
+
+        response = self.api.post("/simple", data='{"name": "yep"}\n{"id": "nope"}\n', content_type="application/x-ndjson")
+        self.assertStatusValue(response, 207, "simples", [
+            {"index": 0, "status": 201, "id": 4},
+            {"index": 1, "status": 400, "message": "invalid literal for int() with base 10: 'nope'"}
+        ])
+
+        app = flask.Flask("msgpack-api")
+        restful = flask_restful.Api(app)
+        restful.add_resource(SimpleResource, *SimpleResource.thy().endpoints())
+        relations_restful.MsgpackSerializer().register(restful)
+
+        response = app.test_client().post(
+            "/simple",
+            data=msgpack.packb({"simple": {"name": "packed"}}),
+            content_type="application/msgpack",
+            headers={"Accept": "application/msgpack"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.content_type, "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.data)["simple"]["name"], "packed")
+
+    def test_page(self):
+
+        Simple("ya").create()
+        Simple("sure").create()
+
+        @relations_restful.exceptions
+        def page():
+            return {"page": SimpleResource().page()}
+
+        self.app.add_url_rule('/page', 'page', page)
+
+        self.assertStatusValue(self.api.get("/page?limit=3"), 200, "page", {
+            "simples": [{"id": 2, "name": "sure"}, {"id": 1, "name": "ya"}],
+            "overflow": False,
+            "formats": {}
+        })
+
+        self.assertStatusValue(self.api.get("/page?count=yes"), 200, "page", {
+            "simples": 2,
+            "overflow": False
+        })
+
+        self.assertStatusValue(self.api.get("/page?limit=1&total=yes"), 200, "page", {
+            "simples": [{"id": 2, "name": "sure"}],
+            "overflow": True,
+            "formats": {},
+            "total": 2,
+            "next": SimpleResource().marker(["+name", "+id"], Simple.one(id=2))
+        })
+
+        self.assertStatusValue(self.api.get("/page?limit=1&layout=rows"), 200, "page", {
+            "simples": {"fields": ["id", "name"], "rows": [[2, "sure"]]},
+            "overflow": True,
+            "formats": {},
+            "next": SimpleResource().marker(["+name", "+id"], Simple.one(id=2))
+        })
+
+        self.assertStatusValue(self.api.get("/page?limit=3&layout=columns&fields=name"), 200, "page", {
+            "simples": {"fields": ["name"], "columns": [["sure", "ya"]]},
+            "overflow": False,
+            "formats": {}
+        })
+
+        self.assertStatusValue(self.api.get("/page?limit=3&layout=columns&name=nope"), 200, "page", {
+            "simples": {"fields": ["id", "name"], "columns": [[], []]},
+            "overflow": False,
+            "formats": {}
+        })
+
     def test_get(self):
 
         simple = Simple("ya").create()
@@ -918,8 +2707,116 @@ class TestResource(TestRestful):
             }
         })
 
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            response = self.api.get(f"/plain?fields=name")
+            self.assertStatusValue(response, 200, "plains", [{"name": "whatevs"}])
+            self.assertStatusValue(response, 200, "formats", {})
+            self.assertEqual(mock_titles.call_count, 0)
+
+        response = self.api.get(f"/plain?fields=name&stream=yes")
+        self.assertEqual(response.json, {"plains": [{"name": "whatevs"}], "overflow": False, "formats": {}})
+
+        response = self.api.get(f"/plain?fields=name&stream=yes&layout=rows")
+        self.assertEqual(response.json, {"plains": {"fields": ["name"], "rows": [["whatevs"]]}, "overflow": False, "formats": {}})
+
+        response = self.api.get(f"/plain?layout=columns&formats=no")
+        self.assertEqual(response.json, {"plains": {"fields": ["simple_id", "name"], "columns": [[simple.id], ["whatevs"]]}, "overflow": False})
+
+        response = self.api.get(f"/plain?layout=columns&stream=yes")
+        self.assertStatusValue(response, 400, "message", "columns can't be streamed, only rows")
+
+        response = self.api.get(f"/plain?export=ndjson&name=whatevs&sort=-name")
+        self.assertEqual(response.get_data(as_text=True).splitlines(), [f'{{"simple_id": {simple.id}, "name": "whatevs"}}'])
+
+        response = self.api.get(f"/simple?export=csv&limit=1", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data).decode().splitlines(), ["id,name", f"{simple.id},ya"])
+
+        with unittest.mock.patch.object(self.source, "titles", wraps=self.source.titles) as mock_titles:
+
+            response = self.api.get(f"/plain?formats=false")
+            self.assertEqual(response.json, {"plains": [{"simple_id": simple.id, "name": "whatevs"}], "overflow": False})
+            self.assertEqual(mock_titles.call_count, 0)
+
+            response = self.api.get(f"/plain?formats=false&stream=yes")
+            self.assertEqual(response.json, {"plains": [{"simple_id": simple.id, "name": "whatevs"}], "overflow": False})
+            self.assertEqual(mock_titles.call_count, 0)
+
+        response = self.api.get(f"/simple/{simple.id}?formats=no")
+        self.assertEqual(response.json, {"simple": {"id": simple.id, "name": "ya"}})
+
+        response = self.api.get(f"/simple/{simple.id}?fields=name")
+        self.assertStatusValue(response, 200, "simple", {"name": "ya"})
+        self.assertEqual(response.headers["ETag"], f'"{SimpleResource.variant(SimpleResource.digest({"id": simple.id, "name": "ya"}), ["name"], {})}"')
+
         response = self.api.get(f"/simple/{simple.id}")
         self.assertStatusModel(response, 200, "simple", {"id": simple.id, "name": "ya"})
+        etag = response.headers["ETag"]
+        self.assertEqual(etag, f'"{SimpleResource.variant(SimpleResource.digest({"id": simple.id, "name": "ya"}), None, {})}"')
+
+        response = self.api.get(f"/simple/{simple.id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+        # Without formats is a different body, so a different ETag, but can be checked before exporting
+
+        response = self.api.get(f"/simple/{simple.id}?formats=no", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        unformatted = response.headers["ETag"]
+        self.assertNotEqual(unformatted, etag)
+
+        with unittest.mock.patch.object(SimpleResource, "formats") as formats:
+            response = self.api.get(f"/simple/{simple.id}?formats=no", headers={"If-None-Match": unformatted})
+            self.assertEqual(response.status_code, 304)
+            formats.assert_not_called()
+
+        # The parent's title is in the formats, so renaming the parent changes the child's ETag
+
+        double = Double(simple_id=simple.id, other_id=simple.id, name="child").create()
+
+        app = flask.Flask("double-api")
+        flask_restful.Api(app).add_resource(DoubleResource, *DoubleResource.thy().endpoints())
+        api = app.test_client()
+
+        response = api.get(f"/double/{double.id}")
+        etag = response.headers["ETag"]
+
+        response = api.get(f"/double/{double.id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        Simple.one(id=simple.id).set(name="renamed").update()
+
+        response = api.get(f"/double/{double.id}", headers={"If-None-Match": etag})
+        self.assertStatusValue(response, 200, "formats", {
+            "simple_id": {"titles": {str(simple.id): ["renamed"]}, "format": [None]},
+            "other_id": {"titles": {str(simple.id): ["renamed"]}, "format": [None]}
+        })
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        # Whatever the representation, it's still the record for If-Match
+
+        response = api.patch(f"/double/{double.id}", json={"double": {"name": "matched"}}, headers={"If-Match": response.headers["ETag"]})
+        self.assertStatusModel(response, 202, "updated", 1)
+
+        Simple.one(id=simple.id).set(name="ya").update()
+
+        # Lists are tagged from the body, without encoding it again to digest it
+
+        with unittest.mock.patch.object(SimpleResource, "digest", wraps=SimpleResource.digest) as digest:
+
+            response = self.api.get(f"/simple")
+            etag = response.headers["ETag"]
+            self.assertEqual(etag, f'"{relations_restful.resource.hashlib.sha1(response.data).hexdigest()}"')
+            digest.assert_not_called()
+
+        response = self.api.get(f"/simple", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.data, b"")
+
+        response = self.api.get(f"/simple?name=nope", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
 
         response = self.api.get("/simple", json={"filter": {"name": "ya"}})
         self.assertStatusModel(response, 200, "simples", [{"id": simple.id, "name": "ya"}])
@@ -954,6 +2851,174 @@ class TestResource(TestRestful):
 
         self.assertEqual(self.api.get("/simple?count=yes").json["simples"], 6)
         self.assertEqual(self.api.get("/simple", json={"count": True}).json["simples"], 6)
+        self.assertEqual(self.api.get("/simple?count=yes&stream=yes").json["simples"], 6)
+
+        response = self.api.get("/simple?limit=4&sort=-id")
+        self.assertStatusModels(response, 200, "simples", [{"id": 6}, {"id": 5}, {"id": 4}, {"id": 3}])
+        self.assertStatusValue(response, 200, "overflow", True)
+
+        response = self.api.get("/simple?limit=4&sort=-id", json={"cursor": response.json["next"]})
+        self.assertStatusModels(response, 200, "simples", [{"id": 2}, {"id": 1}])
+        self.assertStatusValue(response, 200, "overflow", False)
+        self.assertNotIn("next", response.json)
+
+        response = self.api.get("/simple?limit=4&sort=-id&total=yes")
+        self.assertStatusModels(response, 200, "simples", [{"id": 6}, {"id": 5}, {"id": 4}, {"id": 3}])
+        self.assertStatusValue(response, 200, "total", 6)
+
+        response = self.api.get("/simple?limit=4&sort=-id", json={"cursor": response.json["next"], "total": True})
+        self.assertStatusModels(response, 200, "simples", [{"id": 2}, {"id": 1}])
+        self.assertStatusValue(response, 200, "total", 6)
+
+        response = self.api.get(f"/simple?limit=4&cursor={SimpleResource().marker(['-id'], simple)}")
+        self.assertStatusValue(response, 400, "message", "cursor doesn't match sort")
+
+        # Sorting on a kind JSON can't hold still makes a cursor
+
+        for ip in ["1.2.3.9", "1.2.3.4", "1.2.3.7"]:
+            Net(ip=ipaddress.IPv4Address(ip), subnet=ipaddress.IPv4Network("1.2.3.0/24")).create()
+
+        response = self.api.get("/net?sort=ip&limit=2&fields=id")
+        self.assertStatusValue(response, 200, "nets", [{"id": 2}, {"id": 3}])
+        self.assertStatusValue(response, 200, "next", NetResource().marker(["+ip", "+id"], Net.one(id=3)))
+
+        response = self.api.get("/simple?stream=yes&limit=2&sort=-id")
+        self.assertEqual(response.json, {
+            "simples": [{"id": 6, "name": "2"}, {"id": 5, "name": "1"}],
+            "overflow": True,
+            "formats": {}
+        })
+
+        response = self.api.get("/simple", json={"stream": "ndjson", "filter": {"name": "ya"}})
+        self.assertEqual(response.get_data(as_text=True), '{"id": 1, "name": "ya"}\n')
+
+    def test_get_responses(self):
+
+        class CachedResource(relations_restful.Resource):
+            MODEL = Simple
+            RESPONSES = relations_restful.MemoryCache(bytes=10000)
+
+        flask_restful.Api(self.app).add_resource(CachedResource, "/cached", "/cached/<id>")
+
+        simple = Simple("ya").create()
+
+        with unittest.mock.patch.object(self.source, "retrieve", wraps=self.source.retrieve) as mock_retrieve:
+
+            response = self.api.get("/cached")
+            self.assertStatusModels(response, 200, "simples", [{"name": "ya"}])
+            etag = response.headers["ETag"]
+
+            response = self.api.get("/cached")
+            self.assertStatusModels(response, 200, "simples", [{"name": "ya"}])
+            self.assertEqual(response.headers["ETag"], etag)
+
+            response = self.api.get("/cached", headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+
+            response = self.api.get(f"/cached/{simple.id}")
+            self.assertStatusModel(response, 200, "simple", {"name": "ya"})
+
+            response = self.api.get(f"/cached/{simple.id}")
+            self.assertStatusModel(response, 200, "simple", {"name": "ya"})
+
+            self.assertEqual(mock_retrieve.call_count, 2)
+
+            self.api.post("/cached", json={"simple": {"name": "sure"}})
+
+            response = self.api.get("/cached")
+            self.assertStatusModels(response, 200, "simples", [{"name": "sure"}, {"name": "ya"}])
+
+            self.assertEqual(mock_retrieve.call_count, 3)
+
+            self.api.patch(f"/simple/{simple.id}", json={"simple": {"name": "yep"}})
+
+            response = self.api.get(f"/cached/{simple.id}")
+            self.assertStatusModel(response, 200, "simple", {"name": "yep"})
+
+            self.api.delete(f"/simple/{simple.id}")
+
+            response = self.api.get("/cached")
+            self.assertStatusModels(response, 200, "simples", [{"name": "sure"}])
+
+        # Another resource on the same model with the same cache has its own responses
+
+        class ThingResource(relations_restful.Resource):
+            MODEL = Simple
+            SINGULAR = "thing"
+            RESPONSES = CachedResource.RESPONSES
+
+        flask_restful.Api(self.app).add_resource(ThingResource, "/thing")
+
+        self.assertStatusModels(self.api.get("/thing"), 200, "things", [{"name": "sure"}])
+
+        # Children's responses have their parents' titles, so writing a parent drops them
+
+        class CachedPlainResource(relations_restful.Resource):
+            MODEL = Plain
+            RESPONSES = CachedResource.RESPONSES
+
+        flask_restful.Api(self.app).add_resource(CachedPlainResource, "/cached_plain")
+
+        sure = Simple.one(name="sure")
+        Plain(simple_id=sure.id, name="child").create()
+
+        response = self.api.get("/cached_plain")
+        self.assertStatusValue(response, 200, "formats", {"simple_id": {"titles": {str(sure.id): ["sure"]}, "format": [None]}})
+
+        self.api.patch(f"/cached/{sure.id}", json={"simple": {"name": "renamed"}})
+
+        response = self.api.get("/cached_plain")
+        self.assertStatusValue(response, 200, "formats", {"simple_id": {"titles": {str(sure.id): ["renamed"]}, "format": [None]}})
+
+    def test_put(self):
+
+        response = self.api.put("/simple")
+        self.assertStatusValue(response, 400, "message", "either simple or simples required")
+
+        # Generated ids can't be created as sent, so they have to match
+
+        response = self.api.put("/simple/1", json={"simple": {"name": "ya"}})
+        self.assertStatusValue(response, 404, "message", "simple: none retrieved")
+        self.assertEqual(Simple.many().count(), 0)
+
+        response = self.api.put("/simple", json={"simple": {"name": "ya"}})
+        self.assertStatusValue(response, 201, "simple", {"id": 1, "name": "ya"})
+
+        response = self.api.put("/simple/1", json={"simple": {"name": "yep"}})
+        self.assertStatusValue(response, 200, "simple", {"id": 1, "name": "yep"})
+
+        response = self.api.put("/simple", json={"simple": {"id": 42, "name": "nope"}})
+        self.assertStatusValue(response, 404, "message", "simple: none retrieved")
+
+        response = self.api.put("/simple", json={"simple": {"name": "sure"}})
+        self.assertStatusValue(response, 201, "simple", {"id": 2, "name": "sure"})
+
+        response = self.api.put("/simple", json={"simples": [{"id": 2, "name": "whatevs"}, {"name": "new"}]})
+        self.assertStatusValue(response, 200, "simples", [{"id": 2, "name": "whatevs"}, {"id": 3, "name": "new"}])
+        self.assertStatusValue(response, 200, "created", 1)
+        self.assertStatusValue(response, 200, "updated", 1)
+        self.assertNotIn("failed", response.json)
+
+        response = self.api.put("/simple", json={"simples": [{"id": 50, "name": "fifty"}, {"id": 3, "name": "newer"}]})
+        self.assertStatusValue(response, 207, "simples", [{"id": 3, "name": "newer"}])
+        self.assertStatusValue(response, 207, "created", 0)
+        self.assertStatusValue(response, 207, "updated", 1)
+        self.assertStatusValue(response, 207, "failed", [{"index": 0, "status": 404, "message": "simple: none retrieved"}])
+        self.assertEqual(Simple.many().count(), 3)
+
+        # Ids that aren't generated are created as sent, so putting again just updates
+
+        response = self.api.put("/keyed/1", json={"keyed": {"name": "ya"}})
+        self.assertStatusValue(response, 201, "keyed", {"id": 1, "name": "ya"})
+
+        response = self.api.put("/keyed/1", json={"keyed": {"name": "yep"}})
+        self.assertStatusValue(response, 200, "keyed", {"id": 1, "name": "yep"})
+
+        response = self.api.put("/keyed", json={"keyeds": [{"id": 42, "name": "sure"}, {"id": 1, "name": "yes"}]})
+        self.assertStatusValue(response, 200, "keyeds", [{"id": 42, "name": "sure"}, {"id": 1, "name": "yes"}])
+        self.assertStatusValue(response, 200, "created", 1)
+        self.assertStatusValue(response, 200, "updated", 1)
+        self.assertEqual(Keyed.many().count(), 2)
 
     def test_patch(self):
 
@@ -967,15 +3032,48 @@ class TestResource(TestRestful):
         response = self.api.patch(f"/simple/{simple.id}", json={"simple": {"name": "yep"}})
         self.assertStatusModel(response, 202, "updated", 1)
 
+        response = self.api.patch(f"/simple/{simple.id}", json={"simple": {"name": "nope"}}, headers={"If-Match": '"nope"'})
+        self.assertStatusValue(response, 412, "message", "simple has changed")
+
+        etag = self.api.get(f"/simple/{simple.id}").headers["ETag"]
+        response = self.api.patch(f"/simple/{simple.id}", json={"simple": {"name": "yep"}}, headers={"If-Match": etag})
+        self.assertStatusModel(response, 202, "updated", 1)
+
         response = self.api.patch("/simple", json={"filter": {"name": "yep"}, "simple": {"name": "sure"}})
         self.assertStatusModel(response, 202, "updated", 1)
 
+        response = self.api.patch("/simple", json={"filter": {"name": "nope"}, "simple": {"name": "sure"}})
+        self.assertStatusValue(response, 404, "message", "simple: none retrieved")
+        self.assertStatusValue(response, 404, "code", "not_found")
+
         response = self.api.patch("/simple", json={"filter": {"name": "sure"}, "simples": {"name": "whatever"}})
         self.assertStatusModel(response, 202, "updated", 1)
 
         response = self.api.patch("/simple", json={"filter": {"name": "no"}, "simples": {}})
         self.assertStatusModel(response, 202, "updated", 0)
 
+        response = self.api.patch("/simple", json={"simples": [{"id": simple.id, "changes": {"name": "again"}}]})
+        self.assertStatusValue(response, 202, "batches", [{"ids": [simple.id], "updated": 1}])
+        self.assertEqual(Simple.one(id=simple.id).name, "again")
+
+        response = self.api.patch(f"/simple/{simple.id}", data=msgpack.packb({"simple": {"name": "packed"}}), content_type="application/msgpack")
+        self.assertStatusModel(response, 202, "updated", 1)
+        self.assertEqual(Simple.one(id=simple.id).name, "packed")
+
+        # A msgpack ETag stays strong, and still matches the record
+
+        app = flask.Flask("msgpack-api")
+        restful = flask_restful.Api(app)
+        restful.add_resource(SimpleResource, *SimpleResource.thy().endpoints())
+        relations_restful.MsgpackSerializer().register(restful)
+
+        response = app.test_client().get(f"/simple/{simple.id}", headers={"Accept": "application/msgpack"})
+        etag = response.headers["ETag"]
+        self.assertEqual(etag, f'"{SimpleResource.variant(SimpleResource().etag(Simple.one(id=simple.id)), None, {})}-msgpack"')
+
+        response = app.test_client().patch(f"/simple/{simple.id}", json={"simple": {"name": "matched"}}, headers={"If-Match": etag})
+        self.assertStatusModel(response, 202, "updated", 1)
+
     def test_delete(self):
 
         response = self.api.delete(f"/simple")
@@ -985,9 +3083,209 @@ class TestResource(TestRestful):
         response = self.api.delete(f"/simple/{simple.id}")
         self.assertStatusModel(response, 202, "deleted", 1)
 
+        simple = Simple("sure").create()
+        response = self.api.delete(f"/simple/{simple.id}", headers={"If-Match": '"nope"'})
+        self.assertStatusValue(response, 412, "message", "simple has changed")
+
+        etag = self.api.get(f"/simple/{simple.id}").headers["ETag"]
+        response = self.api.delete(f"/simple/{simple.id}", headers={"If-Match": etag})
+        self.assertStatusModel(response, 202, "deleted", 1)
+
         simple = Simple("sure").create()
         response = self.api.delete("/simple", json={"filter": {"name": "sure"}})
         self.assertStatusModel(response, 202, "deleted", 1)
 
         response = self.api.delete("/simple", json={"filter": {"name": "no"}})
         self.assertStatusModel(response, 202, "deleted", 0)
+
+
+class AsyncSimpleResource(relations_restful.AsyncResource):
+    MODEL = Simple
+
+class AsyncPlainResource(relations_restful.AsyncResource):
+    MODEL = Plain
+
+class AsyncDoubleResource(relations_restful.AsyncResource):
+    MODEL = Double
+
+
+class TestAsyncResource(TestRestful):
+
+    def setUp(self):
+
+        self.source = relations.unittest.MockSource("TestRestfulResource")
+
+        self.app = flask.Flask("async-resource-api")
+        restful = flask_restful.Api(self.app)
+
+        restful.add_resource(AsyncSimpleResource, *AsyncSimpleResource.thy().endpoints())
+        restful.add_resource(AsyncPlainResource, *AsyncPlainResource.thy().endpoints())
+        restful.add_resource(AsyncDoubleResource, *AsyncDoubleResource.thy().endpoints())
+
+        self.api = self.app.test_client()
+
+    def test_synchronous(self):
+
+        async def method():
+            return {"synchronous": True}
+
+        with self.app.app_context():
+            self.assertEqual(relations_restful.synchronous(method)(), {"synchronous": True})
+
+    def test_threaded(self):
+
+        @relations_restful.exceptions
+        def threaded():
+            resource = AsyncSimpleResource()
+            response = flask.current_app.ensure_sync(resource.threaded)(lambda self, a: (flask.request.args["a"], a), 1)
+            return {"threaded": response, "loop": resource._loop is not None}
+
+        self.app.add_url_rule('/threaded', 'threaded', threaded)
+
+        response = self.api.get("/threaded?a=b")
+        self.assertStatusValue(response, 200, "threaded", ["b", 1])
+        self.assertStatusValue(response, 200, "loop", True)
+
+    def test_gather(self):
+
+        resource = AsyncSimpleResource()
+
+        self.assertEqual(resource.gather({"a": lambda: 1, "b": lambda: 2}), {"a": 1, "b": 2})
+
+        @relations_restful.exceptions
+        def gather():
+
+            resource = AsyncSimpleResource()
+
+            # Both have to be waiting at once to get past the barrier
+
+            barrier = threading.Barrier(2, timeout=5)
+
+            def lookup(value):
+                barrier.wait()
+                return (flask.request.args["a"], value)
+
+            def gathering(self):
+                return self.gather({"a": functools.partial(lookup, 1), "b": functools.partial(lookup, 2)})
+
+            return {"gather": flask.current_app.ensure_sync(resource.threaded)(gathering)}
+
+        self.app.add_url_rule('/gather', 'gather', gather)
+
+        self.assertStatusValue(self.api.get("/gather?a=b"), 200, "gather", {"a": ["b", 1], "b": ["b", 2]})
+
+    def test_gathered(self):
+
+        resource = AsyncSimpleResource()
+
+        self.assertEqual(asyncio.run(resource.gathered({"a": lambda: 1, "b": lambda: 2})), {"a": 1, "b": 2})
+
+    def test_options(self):
+
+        simple = Simple("ya").create()
+
+        response = self.api.options("/double", json={"double": {"simple_id": simple.id, "other_id": simple.id}})
+        self.assertStatusValue(response, 200, "fields", json.loads(json.dumps(
+            AsyncDoubleResource().fields({}, {"simple_id": simple.id, "other_id": simple.id}).to_list()
+        )))
+
+    def test_post(self):
+
+        response = self.api.post("/simple", json={"simple": {"name": "ya"}})
+        self.assertStatusModel(response, 201, "simple", {"name": "ya"})
+
+        response = self.api.post("/simple", json={"filter": {"name": "ya"}})
+        self.assertStatusModel(response, 200, "simples", [{"name": "ya"}])
+
+        response = self.api.post("/simple", json={})
+        self.assertStatusValue(response, 400, "message", "either simple or simples required")
+
+        response = self.api.post("/simple?limit=x", json={"filter": {"name": "ya"}})
+        self.assertStatusValue(response, 400, "message", "limit values must be integers")
+        self.assertStatusValue(response, 400, "code", "bad_request")
+
+    def test_specified(self):
+
+        with self.app.test_request_context("/simple"):
+            self.assertIsNone(AsyncSimpleResource().specified())
+
+        with self.app.test_request_context("/simple?limit=x"):
+            self.assertEqual(AsyncSimpleResource().specified(), ({"message": "limit values must be integers", "code": "bad_request"}, 400))
+
+    def test_get(self):
+
+        simple = Simple("ya").create()
+        other = Simple("sure").create()
+        simple.double.add(name="whatevs", other_id=other.id).create()
+
+        response = self.api.get("/double")
+        self.assertStatusModel(response, 200, "doubles", [{"simple_id": simple.id, "other_id": other.id, "name": "whatevs"}])
+        self.assertStatusValue(response, 200, "formats", {
+            "simple_id": {"titles": {str(simple.id): ["ya"]}, "format": [None]},
+            "other_id": {"titles": {str(other.id): ["sure"]}, "format": [None]}
+        })
+
+        response = self.api.get("/double?stream=yes")
+        self.assertStatusValue(response, 200, "formats", {
+            "simple_id": {"titles": {str(simple.id): ["ya"]}, "format": [None]},
+            "other_id": {"titles": {str(other.id): ["sure"]}, "format": [None]}
+        })
+
+        response = self.api.get("/simple", headers={"Accept": "text/csv"})
+        self.assertEqual(response.get_data(as_text=True).splitlines(), ["id,name", f"{other.id},sure", f"{simple.id},ya"])
+
+        response = self.api.get(f"/simple/{simple.id}")
+        self.assertStatusModel(response, 200, "simple", {"id": simple.id, "name": "ya"})
+
+        response = self.api.get("/simple/0")
+        self.assertStatusValue(response, 404, "message", "simple: none retrieved")
+
+        # What's asked for is checked with the same error bodies as everything else
+
+        response = self.api.get("/simple?export=xml")
+        self.assertStatusValue(response, 400, "message", "unknown export xml")
+        self.assertStatusValue(response, 400, "code", "bad_request")
+
+        response = self.api.get("/simple?stream=yes&limit=x")
+        self.assertStatusValue(response, 400, "message", "limit values must be integers")
+        self.assertStatusValue(response, 400, "code", "bad_request")
+
+    def test_deferred(self):
+
+        Simple("ya").create()
+
+        with self.app.test_request_context("/simple"):
+            self.assertIsNone(AsyncSimpleResource().deferred())
+
+        with self.app.test_request_context("/simple/1?stream=yes"):
+            self.assertIsNone(AsyncSimpleResource().deferred(1))
+
+        with self.app.test_request_context("/simple?stream=ndjson"):
+            self.assertEqual(AsyncSimpleResource().deferred().get_data(as_text=True), '{"id": 1, "name": "ya"}\n')
+
+        with self.app.test_request_context("/simple?export=xml"):
+            self.assertEqual(AsyncSimpleResource().deferred(), ({"message": "unknown export xml", "code": "bad_request"}, 400))
+
+    def test_put(self):
+
+        response = self.api.put("/simple", json={"simple": {"name": "ya"}})
+        self.assertStatusValue(response, 201, "simple", {"id": 1, "name": "ya"})
+
+        response = self.api.put("/simple/2", json={"simple": {"name": "ya"}})
+        self.assertStatusValue(response, 404, "message", "simple: none retrieved")
+
+    def test_patch(self):
+
+        simple = Simple("ya").create()
+
+        response = self.api.patch(f"/simple/{simple.id}", json={"simple": {"name": "sure"}})
+        self.assertStatusModel(response, 202, "updated", 1)
+        self.assertEqual(Simple.one(id=simple.id).name, "sure")
+
+    def test_delete(self):
+
+        simple = Simple("ya").create()
+
+        response = self.api.delete(f"/simple/{simple.id}")
+        self.assertStatusModel(response, 202, "deleted", 1)
+        self.assertEqual(Simple.many().count(), 0)
@@ -0,0 +1,182 @@
+import unittest
+import unittest.mock
+
+import json
+import decimal
+import datetime
+
+import msgpack
+import werkzeug.exceptions
+
+import flask
+import flask_restful
+
+import relations_restful
+import relations_restful.serializer
+
+
+class TestSerializers(unittest.TestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+
+        self.app = flask.Flask("serializer-api")
+        self.restful = flask_restful.Api(self.app)
+
+        class Data(flask_restful.Resource):
+            def get(self):
+                return {"data": {1: {3, 2}, "when": datetime.date(2022, 1, 2), "cost": decimal.Decimal("1.50")}}
+
+        self.restful.add_resource(Data, "/data")
+
+        self.api = self.app.test_client()
+
+
+class TestSerializer(TestSerializers):
+
+    def test_default(self):
+
+        self.assertEqual(relations_restful.serializer.default({1}), [1])
+        self.assertEqual(relations_restful.serializer.default(frozenset([2])), [2])
+        self.assertEqual(relations_restful.serializer.default(datetime.date(2022, 1, 2)), "2022-01-02")
+        self.assertEqual(relations_restful.serializer.default(datetime.datetime(2022, 1, 2, 3, 4, 5)), "2022-01-02T03:04:05")
+        self.assertEqual(relations_restful.serializer.default(datetime.time(3, 4)), "03:04:00")
+        self.assertEqual(relations_restful.serializer.default(decimal.Decimal("1.50")), "1.50")
+
+    def test_dumps(self):
+
+        self.assertRaisesRegex(NotImplementedError, "need to implement 'dumps' in Serializer", relations_restful.Serializer().dumps, {})
+
+    def test_output(self):
+
+        serializer = relations_restful.Serializer()
+        serializer.dumps = lambda data: json.dumps(data)
+
+        with self.app.test_request_context("/"):
+
+            response = serializer.output({"a": 1}, 201, {"X-Yes": "yep"})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, b'{"a": 1}')
+        self.assertEqual(response.headers["X-Yes"], "yep")
+        self.assertEqual(response.headers["Vary"], "Accept")
+
+    def test_register(self):
+
+        serializer = relations_restful.JSONSerializer()
+
+        serializer.register(self.restful)
+
+        self.assertEqual(self.restful.representations["application/json"], serializer.output)
+
+    def test_fastest(self):
+
+        self.assertIsInstance(relations_restful.Serializer.fastest(), relations_restful.OrjsonSerializer)
+
+        with unittest.mock.patch("relations_restful.serializer.orjson", None):
+            self.assertIsInstance(relations_restful.Serializer.fastest(), relations_restful.JSONSerializer)
+
+
+class TestJSONSerializer(TestSerializers):
+
+    def test_dumps(self):
+
+        serializer = relations_restful.JSONSerializer()
+
+        with self.app.test_request_context("/"):
+
+            self.assertEqual(serializer.dumps({"a": {1, 2}}), '{"a": [1, 2]}\n')
+
+            self.app.config["RESTFUL_JSON"] = {"separators": (",", ":")}
+
+            self.assertEqual(serializer.dumps({"a": 1, "b": 2}), '{"a":1,"b":2}\n')
+
+            self.app.debug = True
+
+            self.assertEqual(serializer.dumps({"a": 1}), '{\n    "a":1\n}\n')
+
+        self.assertEqual(self.app.config["RESTFUL_JSON"], {"separators": (",", ":")})
+
+    def test_output(self):
+
+        relations_restful.JSONSerializer().register(self.restful)
+
+        response = self.api.get("/data")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"data": {"1": [2, 3], "when": "2022-01-02", "cost": "1.50"}})
+
+
+class TestOrjsonSerializer(TestSerializers):
+
+    def test___init__(self):
+
+        with unittest.mock.patch("relations_restful.serializer.orjson", None):
+            self.assertRaisesRegex(ImportError, "orjson isn't installed", relations_restful.OrjsonSerializer)
+
+    def test_dumps(self):
+
+        serializer = relations_restful.OrjsonSerializer()
+
+        with self.app.test_request_context("/"):
+
+            self.assertEqual(serializer.dumps({"a": 1, 2: {3}}), b'{"a":1,"2":[3]}\n')
+            self.assertEqual(serializer.dumps({"big": 2**70}), ('{"big": %s}\n' % 2**70).encode())
+
+            self.app.debug = True
+
+            self.assertEqual(serializer.dumps({"a": 1}), b'{\n  "a": 1\n}\n')
+
+    def test_output(self):
+
+        relations_restful.OrjsonSerializer().register(self.restful)
+
+        response = self.api.get("/data")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, "application/json")
+        self.assertEqual(response.json, {"data": {"1": [2, 3], "when": "2022-01-02", "cost": "1.50"}})
+
+
+class TestMsgpackSerializer(TestSerializers):
+
+    def test___init__(self):
+
+        with unittest.mock.patch("relations_restful.serializer.msgpack", None):
+            self.assertRaisesRegex(ImportError, "msgpack isn't installed", relations_restful.MsgpackSerializer)
+
+    def test_dumps(self):
+
+        serializer = relations_restful.MsgpackSerializer()
+
+        self.assertEqual(msgpack.unpackb(serializer.dumps({"a": 1, 2: {3}}), strict_map_key=False), {"a": 1, 2: [3]})
+
+    def test_loads(self):
+
+        self.assertEqual(relations_restful.MsgpackSerializer.loads(msgpack.packb({"a": [1], 2: None})), {"a": [1], 2: None})
+        self.assertRaisesRegex(werkzeug.exceptions.BadRequest, "invalid msgpack", relations_restful.MsgpackSerializer.loads, b"\xc1")
+        self.assertRaisesRegex(werkzeug.exceptions.BadRequest, "invalid msgpack", relations_restful.MsgpackSerializer.loads, b"\x92\x01")
+
+    def test_output(self):
+
+        relations_restful.JSONSerializer().register(self.restful)
+        relations_restful.MsgpackSerializer().register(self.restful)
+
+        response = self.api.get("/data", headers={"Accept": "application/msgpack"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.data, strict_map_key=False), {"data": {1: [2, 3], "when": "2022-01-02", "cost": "1.50"}})
+
+        response = self.api.get("/data")
+
+        self.assertEqual(response.content_type, "application/json")
+
+        with self.app.test_request_context("/"):
+
+            response = relations_restful.MsgpackSerializer().output({"a": 1}, 200, {"ETag": '"abc"'})
+
+        self.assertEqual(response.headers["ETag"], '"abc-msgpack"')
+        self.assertEqual(response.headers["Vary"], "Accept")
+
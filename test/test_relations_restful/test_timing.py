@@ -0,0 +1,211 @@
+import unittest
+import unittest.mock
+
+import flask
+
+import relations_restful
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test___init__(self):
+
+        histogram = relations_restful.Histogram()
+
+        self.assertEqual(histogram.buckets, relations_restful.Histogram.BUCKETS)
+        self.assertEqual(histogram.counts, [0] * 14)
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.sum, 0.0)
+
+        histogram = relations_restful.Histogram([1, 10])
+
+        self.assertEqual(histogram.buckets, [1, 10])
+        self.assertEqual(histogram.counts, [0, 0, 0])
+
+    def test_observe(self):
+
+        histogram = relations_restful.Histogram([1, 10])
+
+        histogram.observe(0.5)
+        histogram.observe(1)
+        histogram.observe(5)
+        histogram.observe(50)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 56.5)
+
+    def test_to_dict(self):
+
+        histogram = relations_restful.Histogram([1, 2.5])
+
+        histogram.observe(0.5)
+        histogram.observe(2)
+        histogram.observe(3)
+
+        self.assertEqual(histogram.to_dict(), {
+            "count": 3,
+            "sum": 5.5,
+            "buckets": {
+                "1": 1,
+                "2.5": 2,
+                "+Inf": 3
+            }
+        })
+
+
+class TestTimer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.app = flask.Flask("timing-api")
+
+        relations_restful.Timer.HISTOGRAMS.clear()
+
+    def tearDown(self):
+
+        relations_restful.Timer.HISTOGRAMS.clear()
+        relations_restful.Timer.HOOKS.clear()
+
+    @unittest.mock.patch("time.perf_counter")
+    def test___init__(self, mock_time):
+
+        mock_time.return_value = 1
+
+        timer = relations_restful.Timer()
+
+        self.assertEqual(timer.start, 1)
+        self.assertEqual(timer.phases, {})
+
+    @unittest.mock.patch("time.perf_counter")
+    def test_phase(self, mock_time):
+
+        timer = relations_restful.Timer()
+
+        mock_time.side_effect = [1, 1.5, 2, 2.25]
+
+        with timer.phase("query"):
+            pass
+
+        with timer.phase("query"):
+            pass
+
+        self.assertEqual(timer.phases, {"query": 750.0})
+
+        mock_time.side_effect = [3, 3.5]
+
+        def fail():
+            with timer.phase("export"):
+                raise Exception("whoops")
+
+        self.assertRaisesRegex(Exception, "whoops", fail)
+        self.assertEqual(timer.phases, {"query": 750.0, "export": 500.0})
+
+    def test_add(self):
+
+        timer = relations_restful.Timer()
+
+        timer.add("query", 1.5)
+        timer.add("export", 1)
+        timer.add("query", 2)
+
+        self.assertEqual(list(timer.phases.items()), [("query", 3.5), ("export", 1)])
+
+    @unittest.mock.patch("time.perf_counter")
+    def test_elapsed(self, mock_time):
+
+        mock_time.return_value = 1
+
+        timer = relations_restful.Timer()
+
+        mock_time.return_value = 1.25
+
+        self.assertEqual(timer.elapsed(), 250.0)
+
+    def test_header(self):
+
+        timer = relations_restful.Timer()
+
+        timer.add("query", 1.5)
+        timer.add("export", 0.25)
+
+        self.assertEqual(timer.header(2), "query;dur=1.500, export;dur=0.250, total;dur=2.000")
+
+    @unittest.mock.patch("relations_restful.timing.logger")
+    @unittest.mock.patch("time.perf_counter")
+    def test_record(self, mock_time, mock_logger):
+
+        mock_time.return_value = 1
+
+        timer = relations_restful.Timer()
+        timer.add("query", 100)
+
+        hook = unittest.mock.MagicMock()
+
+        def broken(*args):
+            raise Exception("whoops")
+
+        relations_restful.Timer.HOOKS.extend([broken, hook])
+
+        mock_time.return_value = 1.5
+
+        self.assertEqual(timer.record("simple", "get"), 500)
+
+        hook.assert_called_once_with("simple", "get", 500, {"query": 100})
+        mock_logger.exception.assert_called_once_with("timing hook %s failed", broken)
+        self.assertEqual(relations_restful.Timer.HISTOGRAMS[("simple", "get")].count, 1)
+
+    def test_current(self):
+
+        with self.app.test_request_context("/"):
+
+            timer = relations_restful.Timer.current()
+
+            self.assertIs(relations_restful.Timer.current(), timer)
+
+        with self.app.test_request_context("/"):
+
+            self.assertIsNot(relations_restful.Timer.current(), timer)
+
+        with self.app.app_context():
+
+            with self.app.test_request_context("/"):
+                timer = relations_restful.Timer.current()
+
+            with self.app.test_request_context("/"):
+                self.assertIsNot(relations_restful.Timer.current(), timer)
+
+    def test_phased(self):
+
+        with self.app.test_request_context("/"):
+
+            with relations_restful.Timer.phased("spec"):
+                pass
+
+            self.assertNotIn("relations_restful.timer", flask.request.environ)
+
+            timer = relations_restful.Timer.current()
+
+            with relations_restful.Timer.phased("spec"):
+                pass
+
+            self.assertEqual(list(timer.phases), ["spec"])
+
+    def test_histogram(self):
+
+        histogram = relations_restful.Timer.histogram("simple", "get")
+
+        self.assertIs(relations_restful.Timer.histogram("simple", "get"), histogram)
+        self.assertIsNot(relations_restful.Timer.histogram("simple", "post"), histogram)
+
+    def test_stats(self):
+
+        relations_restful.Timer.histogram("simple", "post").observe(2)
+        relations_restful.Timer.histogram("plain", "get").observe(1)
+
+        stats = relations_restful.Timer.stats()
+
+        self.assertEqual([(stat["resource"], stat["method"], stat["count"]) for stat in stats], [
+            ("plain", "get", 1),
+            ("simple", "post", 1)
+        ])